@@ -0,0 +1,45 @@
+import threading
+
+import metrics
+from dataset import normalize_source
+from query import query
+
+_lock = threading.Lock()
+_cache = {}
+
+
+# Order counts for one source, answered by the query layer (the rollup, in practice)
+class SourceAggregates:
+    def __init__(self, dataset, source_name):
+        summary = query(dataset, source_name, agg="summary") or {}
+        self.total_orders = int(summary.get("orders", 0))
+        self.repeat_orders = int(summary.get("repeat_orders", 0))
+        self.city_counts = _counts_frame(query(dataset, source_name, agg="by_city"))
+        self.service_counts = _counts_frame(query(dataset, source_name, agg="by_service"))
+
+    @property
+    def repeat_percentage(self):
+        return (self.repeat_orders / self.total_orders) * 100 if self.total_orders > 0 else 0
+
+
+# Same shape the analytics charts were built from: one row per key, most orders first
+def _counts_frame(counts):
+    return counts.rename("Registration ID").reset_index()
+
+
+# Aggregates for a source, memoized per (source, data version). Entries from older
+# data versions are dropped as soon as a newer version is requested.
+def source_aggregates(dataset, source_name):
+    key = (normalize_source(source_name), dataset.version)
+    aggregates = _cache.get(key)
+    if aggregates is not None:
+        metrics.inc("cache_requests_total", cache="aggregates", result="hit")
+        return aggregates
+    metrics.inc("cache_requests_total", cache="aggregates", result="miss")
+
+    aggregates = SourceAggregates(dataset, source_name)
+    with _lock:
+        for old_key in [k for k in _cache if k[1] < dataset.version]:
+            del _cache[old_key]
+        _cache[key] = aggregates
+    return aggregates
@@ -1,7 +1,9 @@
 import streamlit as st
-import altair as alt
 import pandas as pd
 
+import metrics
+import reports
+
 # Add custom HTML for style (without animations)
 custom_html = """
 <style>
@@ -32,61 +34,39 @@ custom_html = """
 </style>
 """
 
-def show(source_name, data):
+def show(source_name, dataset):
+    # Stage timings for the diagnostics page (see metrics.py)
+    timer = metrics.StageTimer("analytics")
     st.markdown(custom_html, unsafe_allow_html=True)
     st.markdown(f"<h1 class='stTitle'>Analytics Dashboard - {source_name}</h1>", unsafe_allow_html=True)
     source_name = source_name.lower()
-    # Filter data for the logged-in source name
-    data_filter = data[data["Source Name"].str.lower() == source_name]
-
-    if data_filter.empty:
+    if not dataset.has_source(source_name):
         st.warning("No data available for this user.")
         return
+    timer.lap("header")
 
-    # Example: Show top cities by order count
-    city_data = data_filter.groupby("City")["Registration ID"].count().reset_index()
-    city_data = city_data.sort_values(by="Registration ID", ascending=False)
-    city_chart = alt.Chart(city_data).mark_bar().encode(
-        x=alt.X('City', sort=None, axis=alt.Axis(title="City", labelAngle=0)),
-        y=alt.Y('Registration ID', axis=alt.Axis(title="Total Orders")),
-        color=alt.Color('City', legend=alt.Legend(title="City")),
-        tooltip = ['City', 'Registration ID']
-    ).properties(
-        title="Top Cities by Order Count",
-        width=500,
-        height=400
-    ).configure_title(
-        fontSize=20,
-        font='Verdana',
-        anchor='middle',
-        color='#34495e'
-    )
-    st.altair_chart(city_chart, use_container_width=True)
+    # Counts are computed once per source and data version, then reused across reruns
+    aggregates = reports.breakdowns(dataset, source_name)
+    timer.lap("aggregate")
 
-    # Example: Show top services by order count
-    service_data = data_filter.groupby("Service Name")["Registration ID"].count().reset_index()
-    service_data = service_data.sort_values(by="Registration ID", ascending=False)
-    service_chart = alt.Chart(service_data).mark_bar().encode(
-        x=alt.X('Service Name', sort=None, axis=alt.Axis(title="Service Name", labelAngle=0)),
-        y=alt.Y('Registration ID', axis=alt.Axis(title="Total Orders")),
-        color=alt.Color('Service Name', legend=alt.Legend(title="Service Name")),
-        tooltip=['Service Name', 'Registration ID']
-    ).properties(
-        title="Top Services by Order Count",
-        width=500,
-        height=400
-    ).configure_title(
-        fontSize=20,
-        font='Verdana',
-        anchor='middle',
-        color='#34495e'
-    )
-    st.altair_chart(service_chart, use_container_width=True)
+    # Chart specs are cached per source and data version, and pre-binned to a bounded
+    # number of bars and points (see charts.py)
+    for chart in reports.CHARTS:
+        spec = reports.chart(dataset, source_name, chart)
+        timer.lap("charts")
+        st.vega_lite_chart(spec, use_container_width=True)
+        timer.lap("render")
 
     # Example: Show total orders and repeat orders
-    total_orders = data_filter['Registration ID'].count()
-    repeat_orders = data_filter['Car No'].duplicated().sum()
-    repeat_percentage = (repeat_orders / total_orders) * 100 if total_orders > 0 else 0
+    total_orders = aggregates.total_orders
+    repeat_orders = aggregates.repeat_orders
+    repeat_percentage = aggregates.repeat_percentage
+    return_rates = reports.return_rates(dataset, source_name)
+    return_boxes = "".join(f"""
+    <div class="metric-box">
+        <h3>{days}-Day Return Rate:</h3>
+        <p>{f'{rate:.2%}' if rate is not None else 'Not enough history'}</p>
+    </div>""" for days, rate in return_rates.items())
     st.markdown(f"""
     <div class="metric-box">
         <h3>Total Orders:</h3>
@@ -95,5 +75,5 @@ def show(source_name, data):
     <div class="metric-box">
         <h3>Repeat Orders:</h3>
         <p>{repeat_orders} ({repeat_percentage:.2f}% of total orders)</p>
-    </div>
+    </div>{return_boxes}
     """, unsafe_allow_html=True)
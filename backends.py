@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from google_sheets import connect_to_sheet, fetch_columns
+
+# Where sheet data is read from: "sheets" (Google Sheets) or "sqlite" (a local file)
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "sheets")
+
+# Database file used by the sqlite backend; each worksheet is a table of the same name
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(".data", "sheets.db"))
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# Reads worksheets from Google Sheets through the shared gspread client
+class SheetsBackend:
+    name = "sheets"
+    supports_queries = False
+
+    def __init__(self, json_keyfile, spreadsheet_url):
+        self.json_keyfile = json_keyfile
+        self.spreadsheet_url = spreadsheet_url
+
+    # columns limits the frame to those columns; None loads them all
+    def load(self, sheet_name, columns=None):
+        return connect_to_sheet(self.json_keyfile, self.spreadsheet_url, sheet_name, columns)
+
+    # Returns (frame, changed); without a cheap change check every load counts as a change.
+    # Backends that can tell return None for the frame when nothing changed.
+    def sync(self, sheet_name, columns=None):
+        return self.load(sheet_name, columns), True
+
+    # A frame of just these columns in sheet order, or None when the sheet lacks any of them
+    def load_columns(self, sheet_name, columns):
+        return fetch_columns(self.json_keyfile, self.spreadsheet_url, sheet_name, columns)
+
+
+# Reads worksheets from tables in a local SQLite file. It can stand in for Google
+# Sheets in tests and benchmarks, and lets callers push filters and aggregations
+# down as SQL with query().
+class SQLiteBackend:
+    name = "sqlite"
+    supports_queries = True
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def _columns(self, sheet_name):
+        with self._lock:
+            rows = self._db.execute(f"PRAGMA table_info({quote_identifier(sheet_name)})").fetchall()
+        return [row[1] for row in rows]
+
+    def load(self, sheet_name, columns=None):
+        if columns is None:
+            return self.query(f"SELECT * FROM {quote_identifier(sheet_name)} ORDER BY rowid")
+        kept = [column for column in self._columns(sheet_name) if column in set(columns)]
+        if not kept:
+            return pd.DataFrame()
+        selected = ", ".join(quote_identifier(column) for column in kept)
+        return self.query(f"SELECT {selected} FROM {quote_identifier(sheet_name)} ORDER BY rowid")
+
+    # data_version moves when another connection commits, total_changes when this one does
+    def _version(self):
+        with self._lock:
+            data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            return data_version, self._db.total_changes
+
+    # Returns (frame, changed); frame is None when nothing changed since the last sync
+    def sync(self, sheet_name, columns=None):
+        version = self._version()
+        changed = self._versions.get(sheet_name) != version
+        self._versions[sheet_name] = version
+        return (self.load(sheet_name, columns) if changed else None), changed
+
+    def load_columns(self, sheet_name, columns):
+        if any(column not in self._columns(sheet_name) for column in columns):
+            return None
+        selected = ", ".join(quote_identifier(column) for column in columns)
+        return self.query(f"SELECT {selected} FROM {quote_identifier(sheet_name)} ORDER BY rowid")
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._db, params=params)
+
+    # Replace a table with a frame, e.g. a copy of a worksheet or synthetic test data
+    def store(self, sheet_name, data):
+        with self._lock:
+            data.to_sql(sheet_name, self._db, if_exists="replace", index=False)
+            self._db.commit()
+
+
+_lock = threading.Lock()
+_backends = {}
+
+
+# The configured backend for a spreadsheet, created once per process
+def get_backend(json_keyfile, spreadsheet_url, kind=None):
+    kind = kind or DATA_BACKEND
+    if kind == "sheets":
+        key = (kind, json_keyfile, spreadsheet_url)
+    elif kind == "sqlite":
+        key = (kind, SQLITE_PATH)
+    else:
+        raise ValueError(f"Unknown data backend: {kind!r}")
+    with _lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if kind == "sheets":
+                backend = SheetsBackend(json_keyfile, spreadsheet_url)
+            else:
+                backend = SQLiteBackend(SQLITE_PATH)
+            _backends[key] = backend
+        return backend
@@ -0,0 +1,84 @@
+import time
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, numericise_all
+
+
+# In-process stand-in for the parts of the gspread Worksheet API the app uses. Values
+# are held as the values API returns them (strings, trailing empty cells dropped on
+# reads); latency adds a fixed delay per call to model the network round trip.
+class FakeWorksheet:
+    def __init__(self, title, values, latency=0.0):
+        self.title = title
+        self._values = [list(row) for row in values]
+        self.latency = latency
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_all_values(self):
+        self._call()
+        return list(self._values)
+
+    def get_all_records(self):
+        self._call()
+        if not self._values:
+            return []
+        header = self._values[0]
+        return [dict(zip(header, numericise_all(list(row)))) for row in self._values[1:]]
+
+    def _range(self, a1):
+        grid = a1_range_to_grid_range(a1)
+        rows = self._values[grid.get("startRowIndex", 0):grid.get("endRowIndex")]
+        start, end = grid.get("startColumnIndex", 0), grid.get("endColumnIndex")
+        return [_trim(row[start:end]) for row in rows]
+
+    def batch_get(self, ranges):
+        self._call()
+        return [self._range(a1) for a1 in ranges]
+
+    def row_values(self, row):
+        self._call()
+        return _trim(self._values[row - 1]) if row <= len(self._values) else []
+
+    def col_values(self, col):
+        self._call()
+        values = [row[col - 1] if col <= len(row) else "" for row in self._values]
+        return _trim(values)
+
+    def append_rows(self, rows, value_input_option=None):
+        self._call()
+        self._values.extend([str(value) for value in row] for row in rows)
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets):
+        self._worksheets = {worksheet.title: worksheet for worksheet in worksheets}
+
+    def worksheets(self):
+        return list(self._worksheets.values())
+
+    def worksheet(self, title):
+        try:
+            return self._worksheets[title]
+        except KeyError:
+            raise WorksheetNotFound(title) from None
+
+
+# Stand-in for an authorized gspread client; every URL opens the same spreadsheet
+class FakeClient:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_url(self, url):
+        return self.spreadsheet
+
+
+def _trim(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
@@ -0,0 +1,246 @@
+# Benchmarks the app end to end against a synthetic sheet served by an in-process
+# fake of the gspread API, so no credentials or network are needed:
+#
+#   python -m benchmarks.run --profile small --output benchmark_results.json
+#
+# Times the cold load, login, the page computations alone (reports.py) and every
+# page's show() for each source, and records the peak traced memory of each step in a
+# separate pass (tracing slows the code it measures). tracemalloc sees Python and
+# NumPy allocations but not Arrow buffers, so max_rss_bytes is recorded too. Results
+# are written as JSON so runs can be compared for regressions.
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; max_rss_bytes is then left out
+    resource = None
+
+import pandas as pd
+import streamlit as st
+
+import reports
+import sheet_cache
+import snapshot
+from benchmarks import synthetic
+from benchmarks.fake_gspread import FakeClient, FakeSpreadsheet, FakeWorksheet
+from google_sheets import client_manager
+from schema import LOADED_COLUMNS
+
+JSON_KEYFILE = "benchmark-keyfile"
+SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/benchmark"
+SHEET_NAME = "test sheet"
+
+
+# ru_maxrss is KiB on Linux and bytes on macOS
+def _max_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Streamlit widgets return their defaults outside a running app. These stand-ins pick
+# the first real option instead, so each page runs its filtered path: "All Cities",
+# the first plate matching the search prefix, a sort column, and so on.
+@contextmanager
+def _widgets(search_prefix=""):
+    selectbox, text_input = st.selectbox, st.text_input
+
+    def pick(label, options, *args, **kwargs):
+        options = list(options)
+        return options[1] if len(options) > 1 else (options[0] if options else None)
+
+    st.selectbox = pick
+    st.text_input = lambda *args, **kwargs: search_prefix
+    try:
+        yield
+    finally:
+        st.selectbox, st.text_input = selectbox, text_input
+
+
+def _pages(source, owner_password, dataset):
+    import analytics
+    import bill_data
+    import dashboard
+    import show_data
+    return {
+        "dashboard": lambda: dashboard.show(source, dataset),
+        "analytics": lambda: analytics.show(source, dataset),
+        "show_data": lambda: show_data.show(source, dataset),
+        "bill_data": lambda: bill_data.show(source, owner_password, dataset),
+    }
+
+
+def _load():
+    sheet_cache.invalidate(JSON_KEYFILE, SPREADSHEET_URL, SHEET_NAME, drop=True)
+    return sheet_cache.get_dataset(JSON_KEYFILE, SPREADSHEET_URL, SHEET_NAME, columns=LOADED_COLUMNS)
+
+
+def _login(dataset, sizes):
+    for index in range(len(sizes)):
+        name = synthetic.source_name(index).lower()
+        dataset.check_password(name, "user", synthetic.user_password(index))
+        dataset.check_password(name, "owner", synthetic.owner_password(index))
+
+
+# The Streamlit-free work behind all four pages for one source (see reports.py)
+def _compute(dataset, source, plate):
+    reports.kpis(dataset, source)
+    reports.breakdowns(dataset, source)
+    for chart in reports.CHARTS:
+        reports.chart(dataset, source, chart)
+    reports.search_plates(dataset, source, plate[:4])
+    reports.order_details(dataset, source, plate)
+    reports.vehicle_summary(dataset, source, plate)
+    reports.return_rates(dataset, source)
+    first, last = reports.date_bounds(dataset, source)
+    reports.billing(dataset, source, None, first, last)
+
+
+# Runs every step once on a freshly loaded dataset. The "compute" step runs first and
+# builds the memoized indexes and aggregates, so the page steps after it measure
+# rendering on top of warm data. measure(name, fn, **fields) calls fn and returns
+# its result.
+def _scenario(measure, sizes, plates):
+    dataset = measure("load", _load, rows=sum(sizes))
+    measure("login", lambda: _login(dataset, sizes), calls=2 * len(sizes))
+    for index, rows in enumerate(sizes):
+        source = synthetic.source_name(index).lower()
+        measure("compute", lambda: _compute(dataset, source, plates[index]), source=source, rows=rows)
+        with _widgets(plates[index][:4]):
+            for page, show in _pages(source, synthetic.owner_password(index), dataset).items():
+                measure(page, show, source=source, rows=rows)
+    return dataset
+
+
+class _Timings:
+    def __init__(self):
+        self.runs = {}
+        self.fields = {}
+
+    def __call__(self, step, fn, **fields):
+        key = (step, fields.get("source"))
+        started = time.perf_counter()
+        result = fn()
+        self.runs.setdefault(key, []).append(time.perf_counter() - started)
+        self.fields[key] = {"step": step, **fields}
+        return result
+
+
+class _Memory:
+    def __init__(self):
+        self.peaks = {}
+
+    def __call__(self, step, fn, **fields):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        self.peaks[(step, fields.get("source"))] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+
+def run(sizes, repeat, memory, latency, seed):
+    data = synthetic.generate(sizes, seed)
+    plates = [data.loc[data["Source Name"] == synthetic.source_name(i), "Car No"].iloc[0]
+              for i in range(len(sizes))]
+    worksheet = FakeWorksheet(SHEET_NAME, synthetic.to_values(data), latency=latency)
+    del data
+    client_manager.use_client(JSON_KEYFILE, FakeClient(FakeSpreadsheet([worksheet])))
+
+    # The first repeat is cold (indexes and aggregates are built on use); later repeats
+    # reload the sheet, so every repeat measures the same cold path
+    timings = _Timings()
+    for _ in range(repeat):
+        _scenario(timings, sizes, plates)
+
+    peaks = {}
+    if memory:
+        tracemalloc.start()
+        tracker = _Memory()
+        _scenario(tracker, sizes, plates)
+        tracemalloc.stop()
+        peaks = tracker.peaks
+
+    results = []
+    for key, runs in timings.runs.items():
+        results.append({
+            **timings.fields[key],
+            "seconds": statistics.median(runs),
+            "min_seconds": min(runs),
+            "runs": runs,
+            "peak_traced_bytes": peaks.get(key),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark load, login and pages on a synthetic sheet.")
+    parser.add_argument("--profile", choices=sorted(synthetic.PROFILES), default="small",
+                        help="rows per source preset (default: small)")
+    parser.add_argument("--sizes", type=lambda s: [int(v) for v in s.split(",")],
+                        help="comma-separated rows per source, overrides --profile")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per step (default: 3)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each fake API call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the memory pass")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    # Pages log warnings about the missing Streamlit runtime; the benchmark only wants timings
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore")
+    # Local snapshots would turn the cold load into a snapshot read
+    snapshot.SNAPSHOT_DIR = ""
+
+    sizes = args.sizes or synthetic.PROFILES[args.profile]
+    started = time.time()
+    results = run(sizes, args.repeat, args.memory, args.latency, args.seed)
+    report = {
+        "meta": {
+            "started_at": started,
+            "profile": None if args.sizes else args.profile,
+            "sizes": sizes,
+            "rows": sum(sizes),
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "seed": args.seed,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "max_rss_bytes": _max_rss(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for result in results:
+        peak = result["peak_traced_bytes"]
+        print(f"{result['step']:<10} {result.get('source') or '':<10} {result.get('rows', ''):>9} rows "
+              f"{result['seconds'] * 1000:>10.1f} ms"
+              + (f" {peak / 2 ** 20:>9.1f} MiB" if peak is not None else ""))
+    print(f"Wrote {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+# Rows per source for each profile. Sources are deliberately skewed: most are small,
+# one or two hold most of the sheet, as in the live data.
+PROFILES = {
+    "smoke": [1_000, 5_000],
+    "small": [1_000, 5_000, 20_000, 100_000],
+    "medium": [1_000, 10_000, 50_000, 250_000, 1_000_000],
+    "full": [1_000, 10_000, 100_000, 1_000_000, 5_000_000],
+}
+
+# Sheet columns in the order the live worksheet has them
+COLUMNS = [
+    "Source Name", "Registration ID", "City", "Service Name", "Car Name", "Customer Name",
+    "Car Model", "Car Odometer", "Car No", "Mobile No", "Invoice Link", "Delivered Date",
+    "Amount_WO_gst", "total Gmv", "Password", "owner_password",
+]
+
+_CITIES = ["Delhi", "Gurgaon", "Noida", "Mumbai", "Pune", "Bangalore", "Hyderabad", "Chennai",
+           "Kolkata", "Jaipur", "Lucknow", "Chandigarh", "Ahmedabad", "Indore", "Bhopal", "Kochi"]
+_SERVICES = ["Periodic Service", "AC Service", "Car Wash", "Denting Painting", "Brake Service",
+             "Battery Replacement", "Wheel Alignment", "Clutch Repair", "Suspension", "Detailing"]
+_CARS = ["Swift", "Baleno", "i20", "Creta", "City", "Nexon", "Innova", "Alto", "Verna", "XUV500"]
+_MODELS = ["LXI", "VXI", "ZXI", "Petrol", "Diesel", "CNG", "AT", "MT"]
+_STATES = np.asarray(["DL", "HR", "UP", "MH", "KA", "TN", "WB", "RJ", "GJ", "TS"], dtype=object)
+
+
+def source_name(i):
+    return f"Source {i:02d}"
+
+
+def user_password(i):
+    return f"user-{i:02d}"
+
+
+def owner_password(i):
+    return f"owner-{i:02d}"
+
+
+# Zipf-like weights, so a few cities and services take most of the orders
+def _skewed_choice(rng, values, n, exponent=1.1):
+    weights = 1.0 / np.arange(1, len(values) + 1) ** exponent
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=weights / weights.sum())]
+
+
+def _plates(rng, n):
+    states = _STATES[rng.integers(0, len(_STATES), n)]
+    districts = rng.integers(1, 99, n)
+    letters = rng.integers(0, 26, (n, 2)) + ord("A")
+    numbers = rng.integers(1, 9999, n)
+    return [f"{s}{d:02d}{chr(a)}{chr(b)}{num:04d}"
+            for s, d, (a, b), num in zip(states, districts, letters, numbers)]
+
+
+# Rows for one source. About 40% of the orders are repeat visits of the same car,
+# 2% have no delivered date and 1% have a blank odometer, so the mixed-type and
+# missing-value paths of the loader are exercised.
+def _source_rows(rng, index, rows, first_id):
+    cars = max(1, int(rows * 0.6))
+    plates = np.asarray(_plates(rng, cars), dtype=object)
+    car_of_row = rng.integers(0, cars, rows)
+
+    dates = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D")
+    dates = dates.strftime("%Y-%m-%d").to_numpy(dtype=object)
+    dates[rng.random(rows) < 0.02] = ""
+
+    odometer = rng.integers(1_000, 150_000, rows).astype(object)
+    odometer[rng.random(rows) < 0.01] = ""
+
+    amount = rng.integers(500, 25_000, rows)
+    # Some amounts are typed with thousands separators, as in the live sheet
+    amount_text = amount.astype(object)
+    commas = rng.random(rows) < 0.05
+    amount_text[commas] = [f"{value:,}" for value in amount[commas]]
+
+    ids = np.arange(first_id, first_id + rows)
+    return pd.DataFrame({
+        "Source Name": source_name(index),
+        "Registration ID": ids,
+        "City": _skewed_choice(rng, _CITIES, rows),
+        "Service Name": _skewed_choice(rng, _SERVICES, rows),
+        "Car Name": _skewed_choice(rng, _CARS, rows),
+        "Customer Name": [f"Customer {i % 50_000}" for i in ids],
+        "Car Model": _skewed_choice(rng, _MODELS, rows),
+        "Car Odometer": odometer,
+        "Car No": plates[car_of_row],
+        "Mobile No": rng.integers(6_000_000_000, 9_999_999_999, rows),
+        "Invoice Link": [f"https://invoices.example.com/{i}.pdf" for i in ids],
+        "Delivered Date": dates,
+        "Amount_WO_gst": amount_text,
+        "total Gmv": (amount * 1.18).round().astype(int),
+        "Password": user_password(index),
+        "owner_password": owner_password(index),
+    }, columns=COLUMNS)
+
+
+# A sheet with one source per entry of sizes (rows per source), rows interleaved the
+# way orders arrive over time. Values are what get_all_records() would return.
+def generate(sizes, seed=0):
+    rng = np.random.default_rng(seed)
+    parts = []
+    first_id = 100_000
+    for index, rows in enumerate(sizes):
+        parts.append(_source_rows(rng, index, rows, first_id))
+        first_id += rows
+    data = pd.concat(parts, ignore_index=True)
+    return data.iloc[rng.permutation(len(data))].reset_index(drop=True)
+
+
+# The same sheet as the Sheets values API returns it: a header row, then every cell
+# as a string
+def to_values(data):
+    return [list(data.columns)] + data.astype(str).to_numpy().tolist()
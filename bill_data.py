@@ -1,6 +1,11 @@
 import streamlit as st
 import pandas as pd
 
+import metrics
+import reports
+from schema import PAGE_COLUMNS
+from table_view import show_table
+
 # Add custom HTML for modern styling
 custom_html = """
 <style>
@@ -53,34 +58,25 @@ custom_html = """
 </style>
 """
 
-def show(source_name, bill_data, data):
+def show(source_name, bill_data, dataset):
+    # Stage timings for the diagnostics page (see metrics.py)
+    timer = metrics.StageTimer("bill_data")
     source_name = source_name.lower()
 
     st.markdown(custom_html, unsafe_allow_html=True)
     st.markdown("<h1 class='title'>📊 Billing Dashboard</h1>", unsafe_allow_html=True)
 
     # Validate owner password
-    if "owner_password" in data.columns and bill_data in data["owner_password"].values:
-        # Filter data for the selected source name
-        df_bill = data[data["Source Name"].str.lower() == source_name].copy()
-        df_bill["Registration ID"] = df_bill["Registration ID"].astype(str)
-
-        required_columns = [
-            "Customer Name", "Registration ID", "City", "Service Name", "Car Name",
-            "Car Odometer", "Car No", "Mobile No", "Delivered Date",
-            "Amount_WO_gst", "total Gmv"
-        ]
-
-        # Ensure Delivered Date is datetime
-        df_bill["Delivered Date"] = pd.to_datetime(df_bill["Delivered Date"], errors='coerce')
-        data_filter = df_bill[required_columns]
+    if dataset.check_password(source_name, "owner", bill_data):
+        # Rows and totals are computed in reports.py; column types are normalized at load time
+        required_columns = PAGE_COLUMNS["bill_data"]
 
-        if data_filter.empty:
+        if not dataset.has_source(source_name):
             st.markdown("<div class='feedback warning'>No data found for source: <b>{}</b></div>".format(source_name), unsafe_allow_html=True)
             return
 
         # Dropdown to select search type
-        un_city = data_filter["City"].unique()
+        un_city = reports.cities(dataset, source_name)
         search_type = st.selectbox(
             "Search by City",
             options=["Select an option", "All Cities"] + list(un_city),
@@ -89,10 +85,10 @@ def show(source_name, bill_data, data):
         )
 
         if search_type == "All Cities":
-            filtered_data = data_filter
+            city = None
             st.markdown("<div class='feedback success'>Showing data for all cities.</div>", unsafe_allow_html=True)
         elif search_type in un_city:
-            filtered_data = data_filter[data_filter["City"] == search_type]
+            city = search_type
             st.markdown(f"<div class='feedback success'>Showing data for city: <b>{search_type}</b></div>", unsafe_allow_html=True)
         else:
             st.markdown("<div class='feedback warning'>Please select a valid search option.</div>", unsafe_allow_html=True)
@@ -103,19 +99,24 @@ def show(source_name, bill_data, data):
         col1, col2 = st.columns(2)
 
         # Format date input fields
+        first_date, last_date = reports.date_bounds(dataset, source_name, city)
+        if pd.isna(first_date):
+            st.markdown("<div class='feedback warning'>No delivered dates found for this selection.</div>", unsafe_allow_html=True)
+            return
         with col1:
-            start_date = st.date_input("Start Date", filtered_data['Delivered Date'].min().date(), format="DD-MM-YYYY")
+            start_date = st.date_input("Start Date", first_date.date(), format="DD-MM-YYYY")
         with col2:
-            end_date = st.date_input("End Date", filtered_data['Delivered Date'].max().date(), format="DD-MM-YYYY")
+            end_date = st.date_input("End Date", last_date.date(), format="DD-MM-YYYY")
+        timer.lap("filters")
 
         if start_date > end_date:
             st.markdown("<div class='feedback error'>Start date must be earlier than or equal to end date.</div>",
                         unsafe_allow_html=True)
         else:
             # Filter data based on selected date range
-            mask = (filtered_data['Delivered Date'] >= pd.to_datetime(start_date)) & (
-                        filtered_data['Delivered Date'] <= pd.to_datetime(end_date))
-            date_filtered_data = filtered_data[mask]
+            bill = reports.billing(dataset, source_name, city, start_date, end_date, columns=required_columns)
+            date_filtered_data = bill.rows
+            timer.lap("query")
 
             if date_filtered_data.empty:
                 st.markdown(
@@ -126,19 +127,16 @@ def show(source_name, bill_data, data):
                     f"<div class='feedback success'>Data from {start_date.strftime('%d-%m-%Y')} to {end_date.strftime('%d-%m-%Y')}:</div>",
                     unsafe_allow_html=True)
 
-                # Create a copy of the filtered data and format the 'Delivered Date' column
-                date_filtered_data = date_filtered_data.copy()
-                date_filtered_data['Delivered Date'] = date_filtered_data['Delivered Date'].dt.strftime('%d-%m-%Y')
-
                 # Display summary stats
                 st.markdown("<div class='stats-box'>", unsafe_allow_html=True)
-                st.markdown(f"**Total Records:** {date_filtered_data.shape[0]}")
-                st.markdown(f"**Total Amount (WO GST):** ₹{date_filtered_data['Amount_WO_gst'].sum():,.2f}")
-                st.markdown(f"**Total GMV:** ₹{date_filtered_data['total Gmv'].sum():,.2f}")
+                st.markdown(f"**Total Records:** {bill.records}")
+                st.markdown(f"**Total Amount (WO GST):** ₹{bill.amount:,.2f}")
+                st.markdown(f"**Total GMV:** ₹{bill.gmv:,.2f}")
                 st.markdown("</div>", unsafe_allow_html=True)
 
                 # Display data in an expandable section
                 with st.expander("View Filtered Data"):
-                    st.dataframe(date_filtered_data)
+                    show_table(date_filtered_data, key="bill_data", use_container_width=False, date_format='%d-%m-%Y')
+                timer.lap("table")
     else:
         st.markdown("<div class='feedback error'>This section is only accessible to the Owner.<br>Please log in with the Owner password!</div>", unsafe_allow_html=True)
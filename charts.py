@@ -0,0 +1,124 @@
+import threading
+
+import altair as alt
+import numpy as np
+import pandas as pd
+
+import metrics
+from aggregates import source_aggregates
+from dataset import normalize_source
+
+# Charts chart_spec() can build: orders per city, per service and over time
+CHARTS = ("city", "service", "trend")
+
+# Bars shown per breakdown chart; the remaining keys are summed into one OTHER bar
+TOP_N = 10
+OTHER = "Other"
+
+# Upper bound on points in the orders-over-time chart. The bucket is the finest of
+# BUCKETS that keeps the whole date span under it.
+MAX_POINTS = 120
+BUCKETS = [("D", "Day"), ("W-MON", "Week"), ("MS", "Month"), ("QS", "Quarter"), ("YS", "Year")]
+
+_BUCKET_DAYS = {"D": 1, "W-MON": 7, "MS": 31, "QS": 92, "YS": 366}
+
+_lock = threading.Lock()
+_cache = {}
+
+
+# The TOP_N largest counts in order, plus the rest summed under OTHER when there is a rest
+def top_n(counts, n=TOP_N):
+    counts = counts.sort_values(ascending=False, kind="stable")
+    if len(counts) <= n:
+        return counts
+    top = counts.iloc[:n]
+    # A categorical index cannot take the new label
+    top.index = top.index.astype(str)
+    other = pd.Series([counts.iloc[n:].sum()], index=[OTHER])
+    return pd.concat([top, other]).rename_axis(counts.index.name)
+
+
+# (pandas frequency, label) of the finest bucket that keeps first..last under MAX_POINTS
+def bucket(first, last):
+    days = (last - first).days + 1
+    for freq, label in BUCKETS:
+        if days / _BUCKET_DAYS[freq] <= MAX_POINTS:
+            return freq, label
+    return BUCKETS[-1]
+
+
+# Dated orders of a source counted per time bucket, empty buckets included, as a frame
+# of (Delivered Date, Orders) and the bucket label
+def order_trend(dataset, source_name):
+    dates = dataset.date_index(source_name).dates
+    if len(dates) == 0:
+        return pd.DataFrame({"Delivered Date": pd.Series([], dtype="datetime64[ns]"), "Orders": []}), None
+    freq, label = bucket(pd.Timestamp(dates[0]), pd.Timestamp(dates[-1]))
+    counts = pd.Series(np.ones(len(dates), dtype=int), index=pd.DatetimeIndex(dates)).resample(freq).sum()
+    return pd.DataFrame({"Delivered Date": counts.index, "Orders": counts.to_numpy()}), label
+
+
+def _title(chart, title):
+    return chart.properties(
+        title=title,
+        width=500,
+        height=400
+    ).configure_title(
+        fontSize=20,
+        font='Verdana',
+        anchor='middle',
+        color='#34495e'
+    )
+
+
+def _bar_chart(counts, key, title):
+    data = top_n(counts).rename("Registration ID").rename_axis(key).reset_index()
+    chart = alt.Chart(data).mark_bar().encode(
+        x=alt.X(key, sort=None, axis=alt.Axis(title=key, labelAngle=0)),
+        y=alt.Y('Registration ID', axis=alt.Axis(title="Total Orders")),
+        color=alt.Color(key, sort=None, legend=alt.Legend(title=key)),
+        tooltip=[key, 'Registration ID']
+    )
+    return _title(chart, title)
+
+
+def _trend_chart(dataset, source_name):
+    data, label = order_trend(dataset, source_name)
+    chart = alt.Chart(data).mark_line(point=True).encode(
+        x=alt.X('Delivered Date:T', axis=alt.Axis(title=label or "Delivered Date")),
+        y=alt.Y('Orders:Q', axis=alt.Axis(title="Total Orders")),
+        tooltip=[alt.Tooltip('Delivered Date:T', title=label or "Delivered Date"), 'Orders:Q']
+    )
+    return _title(chart, f"Orders per {label}" if label else "Orders over Time")
+
+
+def _build(dataset, source_name, chart):
+    if chart == "city":
+        counts = source_aggregates(dataset, source_name).city_counts.set_index("City")["Registration ID"]
+        return _bar_chart(counts, "City", "Top Cities by Order Count")
+    if chart == "service":
+        counts = source_aggregates(dataset, source_name).service_counts.set_index("Service Name")["Registration ID"]
+        return _bar_chart(counts, "Service Name", "Top Services by Order Count")
+    return _trend_chart(dataset, source_name)
+
+
+# Vega-Lite spec (a dict) of one analytics chart, memoized per (source, data version,
+# chart) like source_aggregates, so reruns skip building the Altair chart and
+# serializing its data. Breakdowns are cut to TOP_N bars and the trend to MAX_POINTS
+# points, so the spec stays small however many rows or keys the source has.
+def chart_spec(dataset, source_name, chart):
+    if chart not in CHARTS:
+        raise ValueError(f"Unknown chart: {chart!r}")
+    key = (normalize_source(source_name), dataset.version, chart)
+    spec = _cache.get(key)
+    if spec is not None:
+        metrics.inc("cache_requests_total", cache="charts", result="hit")
+        return spec
+    metrics.inc("cache_requests_total", cache="charts", result="miss")
+
+    spec = _build(dataset, source_name, chart).to_dict()
+    with _lock:
+        for old_key in [k for k in _cache if k[1] < dataset.version]:
+            del _cache[old_key]
+        _cache[key] = spec
+    return spec
@@ -0,0 +1,82 @@
+import hashlib
+import hmac
+import os
+
+import pandas as pd
+
+# Sheet column holding the password for each login role
+ROLE_COLUMNS = {
+    "user": "Password",
+    "owner": "owner_password",
+}
+
+
+# Passwords are compared case-insensitively, as the login form always has
+def normalize_password(password):
+    return str(password).lower()
+
+
+# Salted password hashes per (source key, role), where the source key is the
+# normalized name used by the dataset's source index. Plaintext passwords are only
+# read while building the store; login is a dict lookup plus a digest compare.
+class CredentialStore:
+    def __init__(self):
+        # A fresh salt per store, so hashes never outlive the data load they came from
+        self._salt = os.urandom(16)
+        self._hashes = {}
+
+    def _hash(self, source_key, password):
+        message = f"{source_key}\0{normalize_password(password)}".encode("utf-8")
+        return hmac.new(self._salt, message, hashlib.sha256).digest()
+
+    def add(self, source_key, role, password):
+        if password is None or str(password) == "":
+            return
+        hashes = self._hashes.setdefault((source_key, role), set())
+        hashes.add(self._hash(source_key, password))
+
+    def check(self, source_key, role, password):
+        hashes = self._hashes.get((source_key, role))
+        if not hashes:
+            return False
+        digest = self._hash(source_key, password)
+        # Compare against every stored hash so timing does not reveal which one matched
+        matched = False
+        for stored in hashes:
+            matched |= hmac.compare_digest(stored, digest)
+        return matched
+
+    def __len__(self):
+        return len(self._hashes)
+
+    # Salt and hashes as JSON-friendly values, so another process can check logins
+    # against the same store (see shared_store.py)
+    def state(self):
+        return {
+            "salt": self._salt.hex(),
+            "hashes": [[source_key, role, sorted(h.hex() for h in hashes)]
+                       for (source_key, role), hashes in self._hashes.items()],
+        }
+
+
+def restore_credentials(state):
+    store = CredentialStore()
+    store._salt = bytes.fromhex(state["salt"])
+    for source_key, role, hashes in state["hashes"]:
+        store._hashes[(source_key, role)] = {bytes.fromhex(h) for h in hashes}
+    return store
+
+
+# Build the store from the rows each source key owns in the source index
+def build_credentials(data, source_index):
+    store = CredentialStore()
+    for role, column in ROLE_COLUMNS.items():
+        if column not in data.columns:
+            continue
+        values = data[column].to_numpy()
+        for source_key, positions in source_index.items():
+            # Many rows share a source and password, so only hash the distinct ones
+            for password in pd.unique(values[positions]):
+                if not pd.isna(password):
+                    store.add(source_key, role, password)
+    return store
@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
 
+import metrics
+import reports
+from schema import PAGE_COLUMNS
+
 # Add custom HTML for styling
 custom_html = """
 <style>
@@ -122,7 +126,9 @@ custom_html = """
 </style>
 """
 
-def show(source_name, data):
+def show(source_name, dataset):
+    # Stage timings for the diagnostics page (see metrics.py)
+    timer = metrics.StageTimer("dashboard")
     source_name = source_name.lower()
 
     st.markdown(custom_html, unsafe_allow_html=True)
@@ -143,44 +149,58 @@ def show(source_name, data):
 
 
     # Check if the necessary columns exist in the data
-    required_columns = ["Source Name", "Registration ID", "City", "Service Name", "Car Name", "Customer Name", "Car Model",
-                        "Car Odometer", "Car No", "Mobile No", "Invoice Link", "Delivered Date"]
-    if not all(col in data.columns for col in required_columns):
+    required_columns = PAGE_COLUMNS["dashboard"]
+    if not dataset.has_columns(required_columns):
         st.markdown("<p class='error'>Some required columns are missing in the data.</p>", unsafe_allow_html=True)
         return
 
-    # Filter data for the logged-in source name
-    data_filter = data[data["Source Name"].str.lower() == source_name]
-
-    if data_filter.empty:
+    # The numbers come from reports.py; this page only renders them
+    if not dataset.has_source(source_name):
         st.markdown("<p class='warning'>No data available for this user.</p>", unsafe_allow_html=True)
         return
+    timer.lap("header")
 
-    # Display basic stats
+    # Display basic stats, precomputed for every source at load time
+    summary = reports.kpis(dataset, source_name)
     st.markdown("<div class='order-stats'>", unsafe_allow_html=True)
-    st.markdown(f"<div class='stat-box'>Total Orders: {data_filter['Registration ID'].count()}</div>", unsafe_allow_html=True)
-    st.markdown(f"<div class='stat-box'>Total Repeat Orders: {data_filter['Car No'].duplicated().sum()}</div>", unsafe_allow_html=True)
-    st.markdown(f"<div class='stat-box'>Working Cities: {data_filter['City'].nunique()}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='stat-box'>Total Orders: {summary['orders']}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='stat-box'>Total Repeat Orders: {summary['repeat_orders']}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='stat-box'>Working Cities: {summary['cities']}</div>", unsafe_allow_html=True)
     st.markdown("</div>", unsafe_allow_html=True)
+    timer.lap("summary")
 
-    # Search for an Order ID
+    # Search for an Order ID; only the top matches are sent to the browser
     st.markdown("<div class='search-box'>", unsafe_allow_html=True)
-    order_ids = data_filter["Car No"].unique()
-    order_id_search = st.selectbox("Search Registration No", options=["Select a Registration No"] + list(order_ids))
+    plate_query = st.text_input("Search Registration No", placeholder="Type the start of a registration number")
+    search = reports.search_plates(dataset, source_name, plate_query)
+    if search.total > len(search.matches):
+        st.caption(f"Showing {len(search.matches)} of {search.total} matches, keep typing to narrow down.")
+    order_id_search = st.selectbox("Matching Registration No", options=["Select a Registration No"] + search.matches)
     st.markdown("</div>", unsafe_allow_html=True)
+    timer.lap("search")
 
-    if order_id_search != "Select a Registration No":
-        # Check if the entered Order ID exists
-        order_details = data_filter[data_filter["Car No"] == order_id_search]
+    if order_id_search and order_id_search != "Select a Registration No":
+        # Jump straight to the rows of the picked plate
+        order_details = reports.order_details(dataset, source_name, order_id_search)
 
-        if not order_details.empty:
+        if order_details:
             st.subheader(f"Order Details for Registration No: {order_id_search}")
-            for index, row in order_details.iterrows():
+            vehicle = reports.vehicle_summary(dataset, source_name, order_id_search)
+            if vehicle:
+                visits = f"{vehicle['visits']} visit{'s' if vehicle['visits'] != 1 else ''}"
+                if pd.notna(vehicle['first_date']):
+                    visits += f", {vehicle['first_date'].strftime('%d-%m-%Y')} to {vehicle['last_date'].strftime('%d-%m-%Y')}"
+                # A falling odometer is a typo in the sheet, not a trend
+                if pd.notna(vehicle['km_per_day']) and vehicle['km_per_day'] >= 0:
+                    visits += f", about {vehicle['km_per_day']:.0f} KM per day"
+                st.caption(visits)
+            for row in order_details:
+                index = row['index']
                 st.markdown(f"""
                 <div class='order-details'>
                     <h4>Car Name: <span class='highlight'>{row['Car Name']}</span></h4>
                     <p><b>Customer Name:</b> {row['Customer Name']}</p>
-                    <p><b>Delivered Date:</b> <span class='highlight'>{row['Delivered Date']}</span></p>
+                    <p><b>Delivered Date:</b> <span class='highlight'>{row['Delivered Date'].strftime('%d-%m-%Y') if pd.notna(row['Delivered Date']) else ''}</span></p>
                     <p><b>Car Odometer:</b> {row['Car Odometer']} KM</p>
                     <p><b>Car No:</b> {row['Car No']}</p>
                     <p><b>Mobile No:</b> {row['Mobile No']}</p>
@@ -189,13 +209,15 @@ def show(source_name, data):
                 """, unsafe_allow_html=True)
 
                 # Display the Invoice Download Button
-                if pd.notna(row['Invoice Link']):
+                invoice_link = row['Invoice Link']
+                if pd.notna(invoice_link):
                     st.download_button(
                         label="Download Invoice",
-                        data=row['Invoice Link'],  # Assuming this is a file link
+                        data=invoice_link,  # Assuming this is a file link
                         file_name=f"Invoice_{order_id_search}.pdf",  # Adjust the file extension based on the file type
                         mime="application/pdf",  # Change MIME type based on file format
                         key=f"download_button_{order_id_search}_{index}"  # Unique key for each button
                     )
         else:
             st.markdown(f"<p class='warning'>No details found for Registration ID: {order_id_search}</p>", unsafe_allow_html=True)
+        timer.lap("details")
@@ -0,0 +1,160 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from credentials import build_credentials
+from date_index import DateIndex
+from plate_index import PlateIndex, empty_plate_index
+from rollup import Rollup
+from vehicle_index import VEHICLE_COLUMNS, VehicleIndex, empty_vehicle_index
+from schema import CREDENTIAL_COLUMNS, LAZY_COLUMNS, ROW_KEY, normalize
+
+
+# Normalized key used for every source name comparison (sheet values and login input)
+def normalize_source(source_name):
+    return str(source_name).strip().lower()
+
+
+# Normalized source name of every row
+def build_source_keys(data):
+    if data.empty or "Source Name" not in data.columns:
+        return pd.Series([], dtype=str)
+    return data["Source Name"].astype(str).str.strip().str.lower()
+
+
+# Map each normalized source name to the row positions it owns, in one groupby pass
+def build_source_index(source_keys):
+    if source_keys.empty:
+        return {}
+    return pd.Series(range(len(source_keys))).groupby(source_keys.to_numpy(), sort=False).indices
+
+
+# A loaded sheet plus the lookup structures derived from it. Built once per data
+# load, so page renders find their rows without scanning the whole frame. The
+# per-source indexes hold row positions, never copies of rows, so a frame attached
+# from the shared store stays the only copy of the data in each worker; pages take
+# just the rows they show.
+# Password columns only feed the credential store and are dropped from data;
+# LAZY_COLUMNS are read from the backend on first use.
+#
+# A dataset attached from the shared store (shared_store.py) is passed its
+# credentials; its data is then already normalized and is used as is.
+class Dataset:
+    def __init__(self, data, version=0, backend=None, sheet_name=None, credentials=None):
+        self.data = normalize(data) if credentials is None else data
+        self.version = version
+        # Where the data came from; backends with supports_queries can answer SQL directly
+        self.backend = backend
+        self.sheet_name = sheet_name
+        source_keys = build_source_keys(self.data)
+        self.source_index = build_source_index(source_keys)
+        if credentials is None:
+            credentials = build_credentials(self.data, self.source_index)
+            self.data = self.data.drop(columns=[c for c in CREDENTIAL_COLUMNS if c in self.data.columns])
+        self.credentials = credentials
+        # Metrics for every source, shared by all sessions until the next load
+        self.rollup = Rollup(self.data, source_keys)
+        self._plate_indexes = {}
+        self._date_indexes = {}
+        self._vehicle_indexes = {}
+        self._lazy = {}
+        self._lock = threading.Lock()
+
+    @property
+    def empty(self):
+        return self.data.empty
+
+    # True when every column is loaded or can be loaded lazily
+    def has_columns(self, columns):
+        loadable = self.backend is not None and ROW_KEY in self.data.columns
+        return all(c in self.data.columns or (loadable and c in LAZY_COLUMNS) for c in columns)
+
+    # A column left out of data at load time, aligned to data.index. Fetched from the
+    # backend once per load together with ROW_KEY and matched on it, not on position,
+    # because the sheet may have changed since data was loaded. Values of rows that
+    # cannot be matched, or whose key is blank or repeated, are None. When the backend
+    # cannot be reached every value is None and nothing is cached, so the next call
+    # tries again.
+    def lazy_column(self, column):
+        if column in self.data.columns:
+            return self.data[column]
+        values = self._lazy.get(column)
+        if values is not None:
+            return values
+        fetched = None
+        if self.backend is not None and ROW_KEY in self.data.columns:
+            try:
+                fetched = self.backend.load_columns(self.sheet_name, [ROW_KEY, column])
+            except Exception:
+                # Pages keep working from the cached data during an outage
+                return self._no_values()
+        if fetched is None:
+            values = self._no_values()
+        else:
+            # Same text form the loaded keys were given by schema.normalize
+            keys = fetched[ROW_KEY].astype(str)
+            unique = ~keys.duplicated(keep=False) & (keys != "")
+            lookup = pd.Series(fetched[column].to_numpy()[unique.to_numpy()], index=keys[unique].to_numpy())
+            values = self.data[ROW_KEY].astype(str).map(lookup).astype(object)
+            values = values.where(values.notna() & (values != ""), None)
+        with self._lock:
+            return self._lazy.setdefault(column, values)
+
+    def _no_values(self):
+        return pd.Series([None] * len(self.data), index=self.data.index, dtype=object)
+
+    def has_source(self, source_name):
+        return normalize_source(source_name) in self.source_index
+
+    # role is "user" or "owner" (see credentials.ROLE_COLUMNS)
+    def check_password(self, source_name, role, password):
+        return self.credentials.check(normalize_source(source_name), role, password)
+
+    # Positions in data of the rows of one source, in sheet order
+    def source_positions(self, source_name):
+        positions = self.source_index.get(normalize_source(source_name))
+        return np.array([], dtype=np.intp) if positions is None else positions
+
+    # Rows for one source, taken from data on every call; prefer the indexes, which
+    # take only the rows asked for
+    def partition(self, source_name):
+        return self.data.iloc[self.source_positions(source_name)]
+
+    # Rows at positions within a source's partition (as the per-source indexes return them)
+    def rows(self, source_name, positions):
+        return self.data.iloc[self.source_positions(source_name)[positions]]
+
+    # Per-source structure built on first use from the source's row positions and
+    # reused until the next load
+    def _per_source(self, store, source_name, build):
+        key = normalize_source(source_name)
+        value = store.get(key)
+        if value is None:
+            value = build(self.source_positions(source_name))
+            with self._lock:
+                value = store.setdefault(key, value)
+        return value
+
+    # Car No search index for one source
+    def plate_index(self, source_name):
+        if "Car No" not in self.data.columns:
+            return empty_plate_index()
+        return self._per_source(self._plate_indexes, source_name,
+                                lambda positions: PlateIndex(self.data["Car No"].iloc[positions]))
+
+    # Delivered Date index for one source, for range filters
+    def date_index(self, source_name):
+        return self._per_source(self._date_indexes, source_name, lambda positions: DateIndex(self.data, positions))
+
+    # Visit history by Car No for one source, for car histories and return rates
+    def vehicle_index(self, source_name):
+        if "Car No" not in self.data.columns:
+            return empty_vehicle_index()
+        columns = [column for column in VEHICLE_COLUMNS if column in self.data.columns]
+        return self._per_source(self._vehicle_indexes, source_name,
+                                lambda positions: VehicleIndex(self.data[columns].iloc[positions]))
+
+
+def empty_dataset():
+    return Dataset(pd.DataFrame())
@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+DATE_COLUMN = "Delivered Date"
+
+
+# The dated rows of one source in delivered-date order, kept as positions into the
+# dataset's frame, with the same per city. Date ranges are answered with two binary
+# searches, and only the rows in the range are taken from the frame, so neither the
+# date filter nor the city filter copies or scans the partition.
+# Rows without a delivered date can never match a range and are left out.
+class DateIndex:
+    def __init__(self, data, positions):
+        self.data = data
+        cities = data["City"].iloc[positions] if "City" in data.columns else None
+        # Cities in the order they first appear in the sheet, as the dropdowns list them
+        self.cities = list(pd.unique(cities)) if cities is not None else []
+
+        dates = data[DATE_COLUMN].to_numpy()[positions]
+        dated = ~np.isnat(dates)
+        order = np.argsort(dates[dated], kind="stable")
+        self.positions = positions[dated][order]
+        self.dates = dates[dated][order]
+
+        if cities is not None and len(self.positions):
+            # Offsets into self.positions of each city's rows, still in date order
+            city_values = cities.to_numpy()[dated][order]
+            self._city_offsets = pd.Series(city_values).groupby(city_values, observed=True, sort=False).indices
+        else:
+            self._city_offsets = {}
+        self._city_rows = {}
+        self._lock = threading.Lock()
+
+    # (positions, dates) of the rows for the source or one city, in date order
+    def _positions_and_dates(self, city):
+        if city is None:
+            return self.positions, self.dates
+        rows = self._city_rows.get(city)
+        if rows is None:
+            offsets = self._city_offsets.get(city)
+            if offsets is None:
+                return self.positions[:0], self.dates[:0]
+            with self._lock:
+                rows = self._city_rows.setdefault(city, (self.positions[offsets], self.dates[offsets]))
+        return rows
+
+    # (first, last) delivered date for the source or one city, NaT when there are none
+    def bounds(self, city=None):
+        _, dates = self._positions_and_dates(city)
+        if len(dates) == 0:
+            return pd.NaT, pd.NaT
+        return pd.Timestamp(dates[0]), pd.Timestamp(dates[-1])
+
+    # Rows with start <= Delivered Date <= end, both bounds inclusive, in date order
+    def range(self, start, end, city=None):
+        positions, dates = self._positions_and_dates(city)
+        lo = np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side="left")
+        hi = np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side="right")
+        return self.data.iloc[positions[lo:hi]]
@@ -0,0 +1,72 @@
+import os
+
+import streamlit as st
+import pandas as pd
+
+import metrics
+from dataset import normalize_source
+
+# Sources whose owners may reset the counters and write the metrics file, comma-separated.
+# Every partner has an owner login and the figures cover the whole server process, so
+# by default nobody can change them from the page.
+ADMIN_SOURCES = {normalize_source(source) for source in os.environ.get("DIAGNOSTICS_ADMIN_SOURCES", "").split(",")
+                 if source.strip()}
+
+
+def _label_text(labels):
+    return ", ".join(f"{name}={value}" for name, value in sorted(labels.items()))
+
+
+# Owner-only page with the counters and timers recorded by this process since it
+# started (see metrics.py). Writing and resetting are limited to ADMIN_SOURCES.
+def show(source_name):
+    st.title("Diagnostics")
+    st.caption("Figures cover this server process since it started.")
+
+    counters, timers = metrics.snapshot()
+
+    # Cache hit rates
+    rates = metrics.hit_rates()
+    if rates:
+        st.subheader("Cache hit rates")
+        columns = st.columns(len(rates))
+        for column, (cache, rate) in zip(columns, sorted(rates.items())):
+            column.metric(cache, f"{rate:.0%}")
+
+    # Timers, slowest total first
+    st.subheader("Timings")
+    if timers:
+        timings = pd.DataFrame([
+            {"metric": name, "labels": _label_text(labels), "count": count,
+             "total s": total, "mean ms": total / count * 1000 if count else 0.0, "max ms": peak * 1000}
+            for name, labels, count, total, peak in timers
+        ]).sort_values("total s", ascending=False)
+        st.dataframe(timings, hide_index=True, use_container_width=True)
+    else:
+        st.info("Nothing timed yet.")
+
+    # Counters: Sheets calls, rows, bytes and cache lookups
+    st.subheader("Counters")
+    if counters:
+        counts = pd.DataFrame([
+            {"metric": name, "labels": _label_text(labels), "value": value}
+            for name, labels, value in counters
+        ])
+        st.dataframe(counts, hide_index=True, use_container_width=True)
+    else:
+        st.info("Nothing counted yet.")
+
+    # Prometheus text dump, downloadable or written next to the app
+    st.subheader("Prometheus export")
+    st.download_button("Download metrics", data=metrics.prometheus_text(), file_name="metrics.prom",
+                       mime="text/plain")
+    if normalize_source(source_name) not in ADMIN_SOURCES:
+        return
+    if st.button(f"Write to {metrics.metrics_path()}"):
+        try:
+            st.success(f"Wrote {metrics.write_prometheus()}")
+        except OSError as e:
+            st.error(f"Could not write metrics: {e}")
+    if st.button("Reset counters"):
+        metrics.reset()
+        st.rerun()
@@ -0,0 +1,124 @@
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+import xlsxwriter
+
+import metrics
+
+# Rows serialized per chunk
+CHUNK_ROWS = 20000
+
+# Bytes read per chunk when streaming a finished XLSX file
+FILE_CHUNK_BYTES = 1 << 20
+
+# Total size of exported files kept for repeat downloads
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+XLSX_DATE_FORMAT = "%d-%m-%Y"
+
+
+def _chunks(data, chunk_rows):
+    for start in range(0, len(data), chunk_rows):
+        yield data.iloc[start:start + chunk_rows]
+
+
+def iter_csv(data, chunk_rows=CHUNK_ROWS):
+    yield data.iloc[0:0].to_csv(index=False).encode("utf-8")
+    for chunk in _chunks(data, chunk_rows):
+        yield chunk.to_csv(index=False, header=False).encode("utf-8")
+
+
+def iter_csv_gzip(data, chunk_rows=CHUNK_ROWS):
+    # wbits=31 writes a gzip header, so the result opens as a regular .csv.gz
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in iter_csv(data, chunk_rows):
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# XLSX is a zip archive that can only be read once it is closed, so rows are written
+# in chunks to a temporary file (constant_memory keeps one row in memory at a time)
+# and the finished file is then streamed back in blocks.
+def iter_xlsx(data, chunk_rows=CHUNK_ROWS):
+    with tempfile.TemporaryFile() as tmp:
+        workbook = xlsxwriter.Workbook(tmp, {"constant_memory": True, "in_memory": False})
+        worksheet = workbook.add_worksheet("Data")
+        worksheet.write_row(0, 0, [str(column) for column in data.columns])
+        row = 1
+        for chunk in _chunks(data, chunk_rows):
+            chunk = chunk.copy()
+            for column in chunk.select_dtypes(include="datetime").columns:
+                chunk[column] = chunk[column].dt.strftime(XLSX_DATE_FORMAT)
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for values in chunk.itertuples(index=False, name=None):
+                worksheet.write_row(row, 0, values)
+                row += 1
+        workbook.close()
+
+        tmp.seek(0)
+        while True:
+            block = tmp.read(FILE_CHUNK_BYTES)
+            if not block:
+                break
+            yield block
+
+
+# label -> (file extension, MIME type, chunk generator)
+FORMATS = OrderedDict([
+    ("Excel (.xlsx)", ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", iter_xlsx)),
+    ("CSV", ("csv", "text/csv", iter_csv)),
+    ("CSV, gzip compressed", ("csv.gz", "application/gzip", iter_csv_gzip)),
+])
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_bytes = 0
+
+
+def _remember(key, content):
+    global _cache_bytes
+    if len(content) > CACHE_MAX_BYTES:
+        return
+    with _lock:
+        if key in _cache:
+            return
+        _cache[key] = content
+        _cache_bytes += len(content)
+        while _cache_bytes > CACHE_MAX_BYTES:
+            _, dropped = _cache.popitem(last=False)
+            _cache_bytes -= len(dropped)
+
+
+# The exported file for key, built from the chunk generator on first request and
+# served from a size-bounded LRU afterwards. key should identify the source, the
+# filters and the data version, so a refresh never serves an outdated file.
+def export_file(key, data, fmt):
+    key = (key, fmt)
+    with _lock:
+        content = _cache.get(key)
+        if content is not None:
+            _cache.move_to_end(key)
+            metrics.inc("cache_requests_total", cache="export", result="hit")
+            return content
+    metrics.inc("cache_requests_total", cache="export", result="miss")
+    generate = FORMATS[fmt][2]
+    content = b"".join(generate(data))
+    _remember(key, content)
+    return content
+
+
+# Callable for st.download_button: nothing is serialized until the button is clicked
+def deferred_export(key, data, fmt):
+    return lambda: export_file(key, data, fmt)
+
+
+def file_name(base_name, fmt):
+    return f"{base_name}.{FORMATS[fmt][0]}"
+
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
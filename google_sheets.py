@@ -1,13 +1,300 @@
+import threading
+from datetime import datetime, timedelta
+
 import gspread
+import httplib2
+from google.auth.exceptions import RefreshError
+from oauth2client.client import AccessTokenRefreshError
 from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+from gspread.utils import numericise_all, rowcol_to_a1
+
+import metrics
+from schema import project
+
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+
+# One authorized session per keyfile, with the spreadsheets and worksheets opened through it
+class _Session:
+    def __init__(self, credentials, client):
+        self.credentials = credentials
+        self.client = client
+        self.spreadsheets = {}
+        self.worksheets = {}
+
 
-def connect_to_sheet(json_keyfile, spreadsheet_url, sheet_name):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+def _authorize(json_keyfile, scope):
     credentials = ServiceAccountCredentials.from_json_keyfile_name(json_keyfile, scope)
-    gc = gspread.authorize(credentials)
+    client = gspread.authorize(credentials)
+    # gspread 6 keeps its requests session on http_client, older versions on the client
+    session = getattr(getattr(client, "http_client", None), "session", None) or getattr(client, "session", None)
+    if session is not None:
+        session.hooks.setdefault("response", []).append(_record_response)
+    return _Session(credentials, client)
+
+
+# requests response hook: HTTP status and bytes of every call to Google APIs
+def _record_response(response, *args, **kwargs):
+    metrics.inc("sheets_http_requests_total", status=str(response.status_code))
+    size = response.headers.get("Content-Length")
+    metrics.inc("sheets_bytes_received_total", int(size) if size else len(response.content))
+
+
+# Make one gspread call, counted and timed under sheets_api_* by method name
+def api_call(method, fn, *args, **kwargs):
+    try:
+        with metrics.timer("sheets_api_seconds", method=method):
+            return fn(*args, **kwargs)
+    finally:
+        metrics.inc("sheets_api_calls_total", method=method)
+
+
+# HTTP status of a gspread APIError
+def api_status(error):
+    code = getattr(error, "code", None)
+    if code is None and getattr(error, "response", None) is not None:
+        code = error.response.status_code
+    return code
+
+
+# Statuses that mean the cached session is unusable: the token expired or was revoked,
+# access was removed, or the spreadsheet or worksheet is gone
+RESET_STATUS = {401, 403, 404}
+
+
+# Whether an error should drop the shared client (see SheetsClientManager.reset).
+# Quota, server and network errors keep it: rebuilding costs a token exchange and two
+# metadata reads, just when the read quota is exhausted.
+def needs_reset(error):
+    if isinstance(error, APIError):
+        return api_status(error) in RESET_STATUS
+    return isinstance(error, (RefreshError, AccessTokenRefreshError, SpreadsheetNotFound, WorksheetNotFound))
+
+
+def _count_rows(sheet_name, rows):
+    metrics.inc("sheets_rows_fetched_total", rows, sheet=sheet_name)
+
+
+# Keeps gspread clients alive across calls so the keyfile parse, token exchange and
+# spreadsheet metadata fetch are paid once per process instead of once per call.
+class SheetsClientManager:
+    def __init__(self, scope=SCOPE, refresh_margin=300):
+        self.scope = scope
+        # Refresh the access token this many seconds before it expires
+        self.refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        self._sessions = {}
+        # One lock per spreadsheet, so opening one does not hold up the others
+        self._open_locks = {}
+
+    def _session(self, json_keyfile):
+        with self._lock:
+            session = self._sessions.get(json_keyfile)
+            if session is None:
+                session = _authorize(json_keyfile, self.scope)
+                self._sessions[json_keyfile] = session
+            else:
+                self._refresh_if_expiring(session)
+            return session
+
+    def _refresh_if_expiring(self, session):
+        # oauth2client stores the expiry as naive UTC; newer gspread versions refresh
+        # on their own and leave it unset, in which case there is nothing to do here
+        expiry = getattr(session.credentials, "token_expiry", None)
+        if expiry is None:
+            return
+        if expiry - datetime.utcnow() > timedelta(seconds=self.refresh_margin):
+            return
+        session.credentials.refresh(httplib2.Http())
+        # Push the new token into the client's HTTP session
+        if hasattr(session.client, "login"):
+            session.client.login()
+
+    def client(self, json_keyfile):
+        return self._session(json_keyfile).client
+
+    def _open_lock(self, json_keyfile, spreadsheet_url):
+        with self._lock:
+            return self._open_locks.setdefault((json_keyfile, spreadsheet_url), threading.RLock())
+
+    def spreadsheet(self, json_keyfile, spreadsheet_url):
+        session = self._session(json_keyfile)
+        with self._open_lock(json_keyfile, spreadsheet_url):
+            spreadsheet = session.spreadsheets.get(spreadsheet_url)
+            if spreadsheet is None:
+                spreadsheet = api_call("open_by_url", session.client.open_by_url, spreadsheet_url)
+                session.spreadsheets[spreadsheet_url] = spreadsheet
+            return spreadsheet
+
+    # The first worksheet opened in a spreadsheet fetches all of its tabs in one call,
+    # so loading several tabs costs one metadata request
+    def worksheet(self, json_keyfile, spreadsheet_url, sheet_name):
+        session = self._session(json_keyfile)
+        with self._open_lock(json_keyfile, spreadsheet_url):
+            worksheet = session.worksheets.get((spreadsheet_url, sheet_name))
+            if worksheet is None:
+                spreadsheet = self.spreadsheet(json_keyfile, spreadsheet_url)
+                for tab in api_call("worksheets", spreadsheet.worksheets):
+                    session.worksheets.setdefault((spreadsheet_url, tab.title), tab)
+                worksheet = session.worksheets.get((spreadsheet_url, sheet_name))
+            if worksheet is None:
+                # Raises WorksheetNotFound, as before
+                worksheet = api_call("worksheet", spreadsheet.worksheet, sheet_name)
+                session.worksheets[(spreadsheet_url, sheet_name)] = worksheet
+            return worksheet
+
+    # Serve a keyfile name from an already authorized client instead of the keyfile,
+    # e.g. the in-process fake used by the benchmarks
+    def use_client(self, json_keyfile, client):
+        with self._lock:
+            self._sessions[json_keyfile] = _Session(None, client)
+
+    # Drop cached sessions so the next call re-authorizes from the keyfile
+    def reset(self, json_keyfile=None):
+        with self._lock:
+            if json_keyfile is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(json_keyfile, None)
+
+
+client_manager = SheetsClientManager()
+
+
+def get_worksheet(json_keyfile, spreadsheet_url, sheet_name):
+    return client_manager.worksheet(json_keyfile, spreadsheet_url, sheet_name)
+
+
+# With columns, only those columns are kept; the rest never become Python objects
+def connect_to_sheet(json_keyfile, spreadsheet_url, sheet_name, columns=None):
+    try:
+        worksheet = get_worksheet(json_keyfile, spreadsheet_url, sheet_name)
+        if columns is None:
+            records = api_call("get_all_records", worksheet.get_all_records)
+            _count_rows(sheet_name, len(records))
+            return pd.DataFrame(records)
+        values = api_call("get_all_values", worksheet.get_all_values)
+    except Exception as e:
+        # A revoked token or a renamed sheet should not stay cached
+        if needs_reset(e):
+            client_manager.reset(json_keyfile)
+        raise
+    _count_rows(sheet_name, max(0, len(values) - 1))
+    if not values:
+        return pd.DataFrame()
+    return _rows_to_frame(values[0], values[1:], columns)
+
+
+# Some columns of a worksheet as a frame, parsed like connect_to_sheet, or None when
+# the sheet lacks any of them
+def fetch_columns(json_keyfile, spreadsheet_url, sheet_name, columns):
+    try:
+        worksheet = get_worksheet(json_keyfile, spreadsheet_url, sheet_name)
+        header = api_call("row_values", worksheet.row_values, 1)
+        if any(column not in header for column in columns):
+            return None
+        values = [api_call("col_values", worksheet.col_values, header.index(column) + 1)[1:]
+                  for column in columns]
+        # col_values drops trailing empty cells, so columns can come back shorter
+        height = max(len(column) for column in values)
+        values = [column + [""] * (height - len(column)) for column in values]
+        _count_rows(sheet_name, height)
+        return _rows_to_frame(list(columns), list(zip(*values)))
+    except Exception as e:
+        if needs_reset(e):
+            client_manager.reset(json_keyfile)
+        raise
+
+
+# Turn raw sheet rows into the same frame get_all_records() would produce, keeping
+# only the given columns when there are any
+def _rows_to_frame(header, rows, columns=None):
+    width = len(header)
+    kept = project(header, columns)
+    positions = [header.index(column) for column in kept]
+    records = []
+    for row in rows:
+        row = (list(row) + [""] * width)[:width]
+        records.append(numericise_all([row[i] for i in positions]))
+    return pd.DataFrame(records, columns=kept)
+
+
+# Keeps a worksheet's frame in memory and brings it up to date by fetching only the
+# rows appended since the last sync. Falls back to a full reload when the header or
+# the last synced row changed, when rows disappeared, and every full_reload_every
+# syncs, since edits further up the sheet cannot be detected cheaply. With columns,
+# the frame holds only those columns; the full header is still tracked for changes.
+class IncrementalSheet:
+    def __init__(self, json_keyfile, spreadsheet_url, sheet_name, full_reload_every=20, columns=None):
+        self.json_keyfile = json_keyfile
+        self.spreadsheet_url = spreadsheet_url
+        self.sheet_name = sheet_name
+        self.full_reload_every = full_reload_every
+        self.columns = columns
+        self.header = None
+        self.last_row = None
+        self.data = None
+        # Sheet rows covered by self.data, header included
+        self.synced_rows = 0
+        self.syncs_since_full = 0
+
+    def _worksheet(self):
+        return get_worksheet(self.json_keyfile, self.spreadsheet_url, self.sheet_name)
+
+    def full_reload(self):
+        values = api_call("get_all_values", self._worksheet().get_all_values)
+        _count_rows(self.sheet_name, max(0, len(values) - 1))
+        if not values:
+            self.header, self.last_row, self.synced_rows = [], None, 0
+            self.data = pd.DataFrame()
+        else:
+            self.header = values[0]
+            self.last_row = values[-1]
+            self.synced_rows = len(values)
+            self.data = _rows_to_frame(self.header, values[1:], self.columns)
+        self.syncs_since_full = 0
+        return self.data
+
+    # Returns (frame, changed); changed is False when nothing new was found
+    def sync(self):
+        try:
+            if self.data is None or not self.header or self.syncs_since_full >= self.full_reload_every:
+                return self.full_reload(), True
+
+            last_col = rowcol_to_a1(1, len(self.header)).rstrip("0123456789")
+            n = self.synced_rows
+            # The whole header row (so added columns are noticed), the last row we already
+            # have and everything after it, in one request
+            header, anchor, appended = api_call("batch_get", self._worksheet().batch_get, [
+                "1:1",
+                f"A{n}:{last_col}{n}",
+                f"A{n + 1}:{last_col}",
+            ])
+            self.syncs_since_full += 1
+            _count_rows(self.sheet_name, len(appended))
+
+            if _trim(header[0] if header else []) != _trim(self.header) or \
+                    _trim(anchor[0] if anchor else []) != _trim(self.last_row):
+                return self.full_reload(), True
+            if not appended:
+                return self.data, False
+
+            new_rows = _rows_to_frame(self.header, appended, self.columns)
+            self.data = pd.concat([self.data, new_rows], ignore_index=True)
+            self.synced_rows += len(appended)
+            self.last_row = appended[-1]
+            return self.data, True
+        except Exception as e:
+            if needs_reset(e):
+                client_manager.reset(self.json_keyfile)
+            raise
+
 
-    spreadsheet = gc.open_by_url(spreadsheet_url)
-    worksheet = spreadsheet.worksheet(sheet_name)
-    data = worksheet.get_all_records()
-    return pd.DataFrame(data)
+# The values API drops trailing empty cells, so compare rows without them
+def _trim(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
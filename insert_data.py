@@ -1,23 +1,32 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
 
+from google_sheets import api_call, client_manager, get_worksheet, needs_reset
+from submission_log import get_log
+from write_queue import MAX_CELL_LENGTH, get_queue
+
+# Sheet column (1-based) that stores each complaint's submission ID, so replays after
+# a failure never append the same complaint twice
+SUBMISSION_ID_COLUMN = 5
+
 
 # Function to connect to Google Sheet and fetch data
 def connect_to_sheet(json_keyfile, spreadsheet_url, sheet_name):
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    credentials = ServiceAccountCredentials.from_json_keyfile_name(json_keyfile, scope)
-    client = gspread.authorize(credentials)
-    sheet = client.open_by_url(spreadsheet_url).worksheet(sheet_name)
-    data = pd.DataFrame(sheet.get_all_records())  # Fetch all records into a DataFrame
+    try:
+        # Reuses the shared authorized client and the already opened worksheet
+        sheet = get_worksheet(json_keyfile, spreadsheet_url, sheet_name)
+        data = pd.DataFrame(api_call("get_all_records", sheet.get_all_records))  # Fetch all records into a DataFrame
+    except Exception as e:
+        if needs_reset(e):
+            client_manager.reset(json_keyfile)
+        raise
     return sheet, data
 
 
-# Function to insert new data into Google Sheet
-def insert_data_to_sheet(sheet, new_data):
-    sheet.append_row(new_data)
+# Function to insert new data into Google Sheet; rows are buffered and written in batches
+def insert_data_to_sheet(queue, new_data):
+    queue.submit(new_data)
 
 
 # Function to run the Streamlit app
@@ -67,39 +76,52 @@ def run():
     sheet_name = "Complained"
 
     try:
-        # Show loading indicator while connecting
-        with st.spinner('Connecting to Google Sheets...'):
-            sheet, data = connect_to_sheet(json_keyfile, spreadsheet_url, sheet_name)
+        # Submissions are committed to the local submission log, then written to the sheet
+        # by the shared write-behind queue; the sheet is only read on refresh
+        queue = get_queue(json_keyfile, spreadsheet_url, sheet_name,
+                          log=get_log(), id_column=SUBMISSION_ID_COLUMN)
 
         # Form to add new data
         st.markdown('<div class="subheader">Add New Data</div>', unsafe_allow_html=True)
         with st.form("add_data_form"):
             car_number = st.text_input("Car Number", key="car_number", placeholder="Enter the car number")
-            remark = st.text_area("Remark of the Problem", key="remark", placeholder="Describe the issue")
+            remark = st.text_area("Remark of the Problem", key="remark", placeholder="Describe the issue",
+                                  max_chars=MAX_CELL_LENGTH)
             additional_field = st.text_input("Additional Information", key="additional_info",
-                                             placeholder="Provide any extra details")
+                                             placeholder="Provide any extra details", max_chars=MAX_CELL_LENGTH)
             complain_date = st.date_input("Date of Complaint", key="complain_date", min_value=datetime.today().date())
             submit_button = st.form_submit_button("Add Data")
 
             if submit_button:
                 # Basic form validation
-                if car_number and remark:
-                    with st.spinner('Submitting your data...'):
-                        # Format date for JSON serialization
-                        date_of_complain = complain_date.isoformat()  # Convert date to ISO format
-                        new_data = [car_number, date_of_complain, remark, additional_field]
-                        insert_data_to_sheet(sheet, new_data)
-                        st.markdown('<div class="success-message">Data added successfully!</div>',
-                                    unsafe_allow_html=True)
-                        # Refresh the app after adding new data
-                        st.rerun()
+                if any(len(value) > MAX_CELL_LENGTH for value in (car_number, remark, additional_field)):
+                    # Google Sheets would reject the row after it was queued
+                    st.markdown(f'<div class="error-message">Each field can hold at most {MAX_CELL_LENGTH} '
+                                f'characters.</div>', unsafe_allow_html=True)
+                elif car_number and remark:
+                    # Format date for JSON serialization
+                    date_of_complain = complain_date.isoformat()  # Convert date to ISO format
+                    new_data = [car_number, date_of_complain, remark, additional_field]
+                    insert_data_to_sheet(queue, new_data)
+                    st.markdown('<div class="success-message">Data added successfully!</div>',
+                                unsafe_allow_html=True)
                 else:
                     st.markdown('<div class="error-message">Please fill in all required fields!</div>',
                                 unsafe_allow_html=True)
 
+        pending = queue.pending()
+        if pending:
+            st.markdown(f'<div class="loading">{pending} submission(s) waiting to be written to the sheet.</div>',
+                        unsafe_allow_html=True)
+        if queue.failed:
+            st.markdown(f'<div class="error-message">{len(queue.failed)} submission(s) were rejected by Google Sheets: '
+                        f'{queue.last_error}</div>', unsafe_allow_html=True)
+
         # Button to refresh data manually
         if st.button("Refresh Data"):
             with st.spinner('Refreshing data...'):
+                # Write out anything still queued so the sheet includes it
+                queue.flush()
                 sheet, data = connect_to_sheet(json_keyfile, spreadsheet_url, sheet_name)
                 if data.empty:
                     st.markdown('<div class="error-message">No data found in the sheet.</div>', unsafe_allow_html=True)
@@ -1,7 +1,11 @@
+import time
+
 import streamlit as st
 from streamlit_option_menu import option_menu
-from google_sheets import connect_to_sheet
-import pandas as pd
+from sheet_loader import SheetSpec, load_sheets
+from dataset import empty_dataset
+import metrics
+from schema import LOADED_COLUMNS
 
 # Set the page configuration
 st.set_page_config(
@@ -15,12 +19,23 @@ json_keyfile = 'agents_keys'
 spreadsheet_url = "https://docs.google.com/spreadsheets/d/1nN11gQ_F38CdjC7Wd0X0tj8ZRY6qgU-cGB9PZ24twc0/edit?gid=0#gid=0"
 sheet_name = "test sheet"
 
-# Fetch data from Google Sheets
-try:
-    data = connect_to_sheet(json_keyfile, spreadsheet_url, sheet_name)
-except Exception as e:
-    st.error(f"Error loading data from Google Sheets: {e}")
-    data = pd.DataFrame()
+# Worksheets loaded on every run. They are fetched concurrently, so adding a tab
+# here costs as much as the slowest sheet, not the sum of all of them.
+sheets = {
+    # Only the columns the pages use are fetched; see schema.PAGE_COLUMNS
+    "orders": SheetSpec(json_keyfile, spreadsheet_url, sheet_name, columns=LOADED_COLUMNS),
+}
+
+# Write the Prometheus dump to METRICS_FILE, when set, for capacity planning
+metrics.start_writer()
+
+# Fetch data from Google Sheets (served from the process-wide cache once warm)
+loaded = load_sheets(sheets)
+if loaded["orders"].ok:
+    dataset = loaded["orders"].dataset
+else:
+    st.error(f"Error loading data from Google Sheets: {loaded['orders'].error}")
+    dataset = empty_dataset()
 
 # Session state for login status
 if "logged_in" not in st.session_state:
@@ -59,15 +74,14 @@ if not st.session_state["logged_in"]:
 
 
     if submit_button:
-        if data.empty:
+        if dataset.empty:
             st.error("User data is not properly loaded or missing required columns.")
         else:
-            # Validate user credentials
-            is_valid_user = (data[(data["Source Name"].str.lower() == source_name) & (data["Password"].str.lower() == password)].any()).any()
+            # Validate user credentials against the hashed lookup built at load time
+            is_valid_user = dataset.check_password(source_name, "user", password)
 
             # Validate owner credentials (if applicable)
-            is_owner = (
-                data[(data["Source Name"].str.lower() == source_name) & (data["owner_password"].str.lower() == password)].any()).any()
+            is_owner = dataset.check_password(source_name, "owner", password)
 
             if is_valid_user:
                 st.session_state["logged_in"] = True
@@ -95,7 +109,7 @@ if st.session_state.get("logged_in"):
 
         # Menu options based on user type (owner or regular user)
         if "owner_password" in st.session_state:
-            menu_options = ["Home", "Dashboard", "Analytics", "Show Data", "Bill Data", "Logout"]
+            menu_options = ["Home", "Dashboard", "Analytics", "Show Data", "Bill Data", "Diagnostics", "Logout"]
         elif "Password" in st.session_state:
             menu_options = ["Home", "Dashboard", "Analytics", "Show Data", "Logout"]
         else:
@@ -128,26 +142,30 @@ if st.session_state.get("logged_in"):
         )
 
     # Define menu pages
+    page_started = time.perf_counter()
     if app == "Home":
         import show_home
         show_home.show_home()
 
     elif app == "Dashboard":
         import dashboard
-        dashboard.show(st.session_state["source_name"], data)
+        dashboard.show(st.session_state["source_name"], dataset)
 
     elif app == "Analytics":
         import analytics
-        analytics.show(st.session_state["source_name"], data)
+        analytics.show(st.session_state["source_name"], dataset)
 
     elif app == "Show Data":
         import show_data
-        show_data.show(st.session_state["source_name"], data)
+        show_data.show(st.session_state["source_name"], dataset)
 
     elif app == "Bill Data" and "owner_password" in st.session_state:
         import bill_data
-        bill_data.show(st.session_state["source_name"], st.session_state["owner_password"], data)
+        bill_data.show(st.session_state["source_name"], st.session_state["owner_password"], dataset)
 
+    elif app == "Diagnostics" and "owner_password" in st.session_state:
+        import diagnostics
+        diagnostics.show(st.session_state["source_name"])
 
     elif app == "Logout":
         # Reset session state
@@ -155,3 +173,6 @@ if st.session_state.get("logged_in"):
         st.session_state["source_name"] = ""
         st.session_state.pop("owner_password", None)
         st.rerun()
+
+    # Whole-page render time, next to the per-stage timings the pages record
+    metrics.observe("page_seconds", time.perf_counter() - page_started, page=app)
@@ -0,0 +1,200 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# File the Prometheus text dump is written to; "{pid}" is replaced by the process ID so
+# several workers on one host do not overwrite each other. Empty disables the writer.
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+
+# Seconds between background writes of METRICS_FILE
+WRITE_INTERVAL = float(os.environ.get("METRICS_WRITE_INTERVAL", 60))
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Help text for each metric, used in the Prometheus dump
+HELP = {
+    "sheets_api_calls_total": "Google Sheets API calls made through gspread, by method.",
+    "sheets_api_seconds": "Time spent in Google Sheets API calls, by method.",
+    "sheets_http_requests_total": "HTTP requests sent to Google APIs, by status code.",
+    "sheets_bytes_received_total": "Response bytes received from Google APIs.",
+    "sheets_rows_fetched_total": "Sheet rows downloaded, by worksheet.",
+    "sheet_load_seconds": "Time to fetch a worksheet and build its dataset, by worksheet.",
+    "cache_requests_total": "Cache lookups, by cache and result.",
+    "query_seconds": "Time spent answering query() calls, by plan and aggregation.",
+    "page_seconds": "Time to render a page, by page.",
+    "page_stage_seconds": "Time spent in each stage of a page render, by page and stage.",
+}
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(seconds)
+
+
+# Record how long the block takes, also when it raises
+@contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+# Splits a page render into stages without re-indenting it: each lap(stage) records
+# the time since the previous lap (or since the timer was created) under that stage.
+class StageTimer:
+    def __init__(self, page):
+        self.page = page
+        self._last = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        observe("page_stage_seconds", now - self._last, page=self.page, stage=stage)
+        self._last = now
+
+
+# Counters as [(name, labels, value)] and timers as [(name, labels, count, sum, max)],
+# sorted by name, for the diagnostics page
+def snapshot():
+    with _lock:
+        counters = [(name, dict(labels), value) for (name, labels), value in _counters.items()]
+        timers = [(name, dict(labels), h.count, h.sum, h.max) for (name, labels), h in _histograms.items()]
+    return sorted(counters, key=lambda c: (c[0], sorted(c[1].items()))), \
+        sorted(timers, key=lambda t: (t[0], sorted(t[1].items())))
+
+
+# Hits / lookups per cache, from the cache_requests_total counter
+def hit_rates():
+    totals = {}
+    for name, labels, value in snapshot()[0]:
+        if name != "cache_requests_total":
+            continue
+        hits, lookups = totals.get(labels["cache"], (0, 0))
+        totals[labels["cache"]] = (hits + (value if labels["result"] == "hit" else 0), lookups + value)
+    return {cache: hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _header(lines, name, kind):
+    if name in HELP:
+        lines.append(f"# HELP {name} {HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+# Everything recorded so far in the Prometheus text exposition format. Timers are
+# histograms in seconds.
+def prometheus_text():
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h.counts), h.count, h.sum)) for key, h in _histograms.items())
+    lines = []
+    previous = None
+    for (name, labels), value in counters:
+        if name != previous:
+            _header(lines, name, "counter")
+            previous = name
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), (counts, count, total) in histograms:
+        if name != previous:
+            _header(lines, name, "histogram")
+            previous = name
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, counts):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_path(path=None):
+    return (path or METRICS_FILE or "metrics.prom").format(pid=os.getpid())
+
+
+# Write the dump atomically, so a scraper reading the file never sees half of it
+def write_prometheus(path=None):
+    path = metrics_path(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+
+def _write_loop():
+    while True:
+        time.sleep(WRITE_INTERVAL)
+        try:
+            write_prometheus()
+        except OSError:
+            pass
+
+
+_writer = None
+
+
+# Start writing METRICS_FILE every WRITE_INTERVAL seconds, once per process
+def start_writer():
+    global _writer
+    with _lock:
+        if _writer is not None or not METRICS_FILE:
+            return
+        _writer = threading.Thread(target=_write_loop, daemon=True, name="metrics-writer")
+    _writer.start()
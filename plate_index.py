@@ -0,0 +1,54 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Upper bound for prefix ranges; sorts after every character a normalized plate can hold
+_PREFIX_END = "\x7f"
+
+
+# "dl 01-ab 1234" and "DL01AB1234" are the same plate
+def normalize_plate(plate):
+    return re.sub(r"[^A-Z0-9]", "", str(plate).upper())
+
+
+# normalize_plate for a whole column, as a NumPy string array
+def normalize_plates(car_numbers):
+    return car_numbers.astype(str).str.upper().str.replace(r"[^A-Z0-9]", "", regex=True).to_numpy(dtype="U")
+
+
+# Sorted index of the Car No values of one source partition. Searches are a binary
+# search over the distinct normalized plates.
+class PlateIndex:
+    def __init__(self, car_numbers):
+        raw = car_numbers.astype(str).to_numpy()
+        normalized = normalize_plates(car_numbers)
+        order = np.argsort(normalized, kind="stable")
+        sorted_plates = normalized[order]
+
+        self.plates, starts = np.unique(sorted_plates, return_index=True)
+        # Show each plate the way it was first written in the sheet
+        self.labels = raw[order[starts]]
+
+    def __len__(self):
+        return len(self.plates)
+
+    def _range(self, query):
+        prefix = normalize_plate(query)
+        lo = np.searchsorted(self.plates, prefix, side="left")
+        hi = np.searchsorted(self.plates, prefix + _PREFIX_END, side="left")
+        return lo, hi
+
+    # Number of distinct plates starting with the query
+    def count(self, query):
+        lo, hi = self._range(query)
+        return int(hi - lo)
+
+    # Up to limit plate labels starting with the query, in sorted order
+    def search(self, query, limit=20):
+        lo, hi = self._range(query)
+        return list(self.labels[lo:min(hi, lo + limit)])
+
+
+def empty_plate_index():
+    return PlateIndex(pd.Series([], dtype=str))
@@ -0,0 +1,141 @@
+import time
+
+import pandas as pd
+
+import metrics
+from dataset import normalize_source
+from backends import quote_identifier
+
+# Aggregations query() can answer
+#   "summary":    orders, amount, gmv, repeat_orders and cities for the whole source
+#   "totals":     orders, amount and gmv for the selected rows
+#   "by_city":    orders per City for the selected rows, most first
+#   "by_service": orders per Service Name for the selected rows, most first
+AGGREGATIONS = ("summary", "totals", "by_city", "by_service")
+
+_BREAKDOWNS = {"by_city": "City", "by_service": "Service Name"}
+_TOTAL_COLUMNS = {"amount": "Amount_WO_gst", "gmv": "total Gmv"}
+
+
+class QueryResult:
+    def __init__(self, value, plan):
+        self.value = value
+        # How the request was answered, e.g. "rollup" or "date_index"; useful when profiling
+        self.plan = plan
+
+
+def _covers_all_dates(dataset, source, city, date_range):
+    first, last = date_bounds(dataset, source, city)
+    if pd.isna(first):
+        return True
+    start, end = date_range
+    return pd.Timestamp(start) <= first and last <= pd.Timestamp(end)
+
+
+def _rows(dataset, source, city, date_range, columns):
+    missing = [column for column in columns or [] if column not in dataset.data.columns]
+    if missing:
+        return _backend_rows(dataset, source, city, date_range, columns)
+
+    if date_range is not None:
+        rows, plan = dataset.date_index(source).range(*date_range, city=city), "date_index"
+    elif city is not None:
+        partition = dataset.partition(source)
+        rows, plan = partition[partition["City"] == city], "source_index+scan"
+    else:
+        rows, plan = dataset.partition(source), "source_index"
+    if columns is not None:
+        rows = rows[columns]
+    return rows, plan
+
+
+# Columns the in-memory frame does not hold are read from the backend, with the
+# source and city filters pushed down as SQL
+def _backend_rows(dataset, source, city, date_range, columns):
+    backend = dataset.backend
+    if backend is None or not backend.supports_queries:
+        raise KeyError(f"Columns not loaded and no queryable backend: {columns}")
+    selected = list(columns)
+    if date_range is not None and "Delivered Date" not in selected:
+        selected.append("Delivered Date")
+    sql = (f"SELECT {', '.join(quote_identifier(c) for c in selected)} "
+           f"FROM {quote_identifier(dataset.sheet_name)} "
+           f"WHERE lower(trim({quote_identifier('Source Name')})) = ?")
+    params = [normalize_source(source)]
+    if city is not None:
+        sql += f" AND {quote_identifier('City')} = ?"
+        params.append(city)
+    rows = backend.query(sql, params)
+    if date_range is not None:
+        # Dates are stored as sheet text, so the range is applied after parsing
+        dates = pd.to_datetime(rows["Delivered Date"], errors="coerce")
+        start, end = (pd.Timestamp(bound) for bound in date_range)
+        rows = rows[(dates >= start) & (dates <= end)][columns]
+    return rows.reset_index(drop=True), "backend"
+
+
+def _aggregate(dataset, source, city, date_range, agg):
+    source_key = normalize_source(source)
+    rollup = dataset.rollup
+    # The rollup keeps dated and undated rows apart, so totals over a range that covers
+    # every dated row can come from it too
+    from_rollup = rollup.available and (date_range is None or _covers_all_dates(dataset, source, city, date_range))
+
+    if agg == "summary":
+        if rollup.available:
+            return rollup.summary(source_key), "rollup"
+        return _summary(dataset.partition(source)), "source_index"
+    if from_rollup and agg == "totals":
+        return rollup.totals(source_key, city=city, dated_only=date_range is not None), "rollup"
+    if rollup.available and date_range is None and city is None:
+        return rollup.breakdown(source_key, _BREAKDOWNS[agg]), "rollup"
+
+    rows, plan = _rows(dataset, source, city, date_range, None)
+    if agg == "totals":
+        totals = {"orders": int(rows["Registration ID"].count())}
+        totals.update({name: rows[column].sum() for name, column in _TOTAL_COLUMNS.items()})
+        return totals, plan
+    counts = rows.groupby(_BREAKDOWNS[agg], observed=True)["Registration ID"].count()
+    return counts[counts > 0].sort_values(ascending=False), plan
+
+
+# The rollup's per-source summary computed from a partition, for sheets the rollup
+# cannot be built for (e.g. without the money columns). None when there are no rows.
+def _summary(rows):
+    if rows.empty:
+        return None
+    summary = {"orders": int(rows["Registration ID"].count()) if "Registration ID" in rows.columns else len(rows)}
+    summary.update({name: rows[column].sum() if column in rows.columns else 0.0
+                    for name, column in _TOTAL_COLUMNS.items()})
+    summary["repeat_orders"] = int(rows["Car No"].duplicated().sum()) if "Car No" in rows.columns else 0
+    summary["cities"] = int(rows["City"].nunique()) if "City" in rows.columns else 0
+    return summary
+
+
+# Rows or an aggregate for one source. Filters are optional:
+#   city:       one city, or None for all
+#   date_range: (start, end) on Delivered Date, both inclusive, or None for all rows
+#   columns:    columns to return for row queries, or None for all
+#   agg:        one of AGGREGATIONS, or None to return rows
+# The request is answered from the cheapest structure that can: the load-time rollup,
+# the per-source date index, the source partition, or SQL on the backend.
+def query(dataset, source, city=None, date_range=None, columns=None, agg=None, explain=False):
+    started = time.perf_counter()
+    if agg is None:
+        value, plan = _rows(dataset, source, city, date_range, columns)
+    elif agg in AGGREGATIONS:
+        value, plan = _aggregate(dataset, source, city, date_range, agg)
+    else:
+        raise ValueError(f"Unknown aggregation: {agg!r}")
+    metrics.observe("query_seconds", time.perf_counter() - started, plan=plan, agg=agg or "rows")
+    return QueryResult(value, plan) if explain else value
+
+
+# Cities of a source in the order they first appear in the sheet
+def cities(dataset, source):
+    return dataset.date_index(source).cities
+
+
+# (first, last) delivered date for a source or one of its cities
+def date_bounds(dataset, source, city=None):
+    return dataset.date_index(source).bounds(city)
@@ -0,0 +1,160 @@
+import math
+
+import numpy as np
+
+import query as data_query
+import charts
+from aggregates import source_aggregates
+
+# The computations behind each page, free of Streamlit. Every function takes a Dataset
+# and plain filter values and returns plain data (frames, dicts, small classes), so
+# the pages only render, and the same work can be cached, profiled, benchmarked or
+# run off the script thread.
+
+# Plate matches returned to the dashboard search box
+SEARCH_LIMIT = 25
+
+# Columns shown for one order on the dashboard
+ORDER_FIELDS = ["Car Name", "Customer Name", "Delivered Date", "Car Odometer", "Car No", "Mobile No",
+                "Service Name", "Invoice Link"]
+
+
+# All rows of a source; empty when the source has none
+def source_rows(dataset, source_name):
+    return data_query.query(dataset, source_name)
+
+
+# Headline numbers for a source: {"orders", "repeat_orders", "cities"} as ints
+def kpis(dataset, source_name):
+    summary = data_query.query(dataset, source_name, agg="summary") or {}
+    return {name: int(summary.get(name, 0)) for name in ("orders", "repeat_orders", "cities")}
+
+
+class PlateSearch:
+    def __init__(self, matches, total):
+        # Up to limit plate labels in sort order, and how many plates match in all
+        self.matches = matches
+        self.total = total
+
+
+def search_plates(dataset, source_name, text, limit=SEARCH_LIMIT):
+    plate_index = dataset.plate_index(source_name)
+    return PlateSearch(plate_index.search(text, limit=limit), plate_index.count(text))
+
+
+# Every order of one plate, oldest first, as a dict of ORDER_FIELDS plus "index", the
+# row label that stays stable for widget keys. Invoice links are read lazily on first use.
+def order_details(dataset, source_name, plate):
+    rows = dataset.rows(source_name, dataset.vehicle_index(source_name).history(plate))
+    if rows.empty:
+        return []
+    invoice_links = dataset.lazy_column("Invoice Link")
+    orders = []
+    for index, row in rows.iterrows():
+        order = {field: row.get(field) for field in ORDER_FIELDS if field != "Invoice Link"}
+        order["Invoice Link"] = invoice_links.get(index)
+        order["index"] = index
+        orders.append(order)
+    return orders
+
+
+# Summary of one car's visits (see vehicle_index.VehicleIndex.vehicles), or None when
+# the plate has no orders in the source
+def vehicle_summary(dataset, source_name, plate):
+    return dataset.vehicle_index(source_name).vehicle(plate)
+
+
+# {days: share of visits followed by a return within days} for RETURN_WINDOWS; a rate
+# is None when no visit is old enough to tell
+def return_rates(dataset, source_name):
+    return dataset.vehicle_index(source_name).return_rates()
+
+
+# Order counts per city and per service plus repeat-order figures; see
+# aggregates.SourceAggregates. Memoized per source and data version.
+def breakdowns(dataset, source_name):
+    return source_aggregates(dataset, source_name)
+
+
+# Analytics charts, in page order
+CHARTS = charts.CHARTS
+
+
+# Vega-Lite spec of one of CHARTS; see charts.chart_spec. Memoized per source, data
+# version and chart.
+def chart(dataset, source_name, name):
+    return charts.chart_spec(dataset, source_name, name)
+
+
+# Cities of a source in sheet order, for the city filter
+def cities(dataset, source_name):
+    return list(data_query.cities(dataset, source_name))
+
+
+# (first, last) delivered date for the filter defaults; NaT when nothing is dated
+def date_bounds(dataset, source_name, city=None):
+    return data_query.date_bounds(dataset, source_name, city)
+
+
+# Rows of a source for one city (None for all) delivered between start and end,
+# both inclusive, limited to columns
+def filtered_rows(dataset, source_name, city, start, end, columns=None):
+    return data_query.query(dataset, source_name, city=city, date_range=(start, end), columns=columns)
+
+
+class Billing:
+    def __init__(self, rows, totals):
+        self.rows = rows
+        self.records = len(rows)
+        self.amount = totals["amount"]
+        self.gmv = totals["gmv"]
+
+
+# Rows and money totals for the billing page
+def billing(dataset, source_name, city, start, end, columns=None):
+    rows = filtered_rows(dataset, source_name, city, start, end, columns)
+    # Served from the load-time rollup when the range covers every dated row
+    totals = data_query.query(dataset, source_name, city=city, date_range=(start, end), agg="totals")
+    return Billing(rows, totals)
+
+
+# Row positions of data ordered by one column; missing values always go last
+def sorted_positions(data, column, ascending=True):
+    values = data[column].reset_index(drop=True)
+    return values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+
+
+class TablePage:
+    def __init__(self, rows, start, end, total, page, page_count):
+        self.rows = rows
+        # Rows start..end (0-based, end exclusive) of total are in rows
+        self.start = start
+        self.end = end
+        self.total = total
+        self.page = page
+        self.page_count = page_count
+
+
+def page_count(total_rows, page_size):
+    return max(1, math.ceil(total_rows / page_size))
+
+
+# One page of a frame, sorted by sort_by when it is a column. Only the page's rows
+# are taken, and date columns are formatted on them alone when date_format is set.
+def table_page(data, page, page_size, sort_by=None, descending=False, date_format=None):
+    total_rows = len(data)
+    pages = page_count(total_rows, page_size)
+    page = min(max(1, int(page)), pages)
+    start = (page - 1) * page_size
+    end = min(start + page_size, total_rows)
+    if sort_by in data.columns:
+        positions = sorted_positions(data, sort_by, ascending=not descending)[start:end]
+    else:
+        positions = np.arange(start, end)
+
+    rows = data.iloc[positions]
+    if date_format:
+        rows = rows.copy()
+        for column in rows.select_dtypes(include="datetime").columns:
+            rows[column] = rows[column].dt.strftime(date_format)
+    return TablePage(rows, start, end, total_rows, page, pages)
@@ -0,0 +1,65 @@
+import pandas as pd
+
+# Columns the rollup needs; without all of them no rollup is built
+ROLLUP_COLUMNS = ["Registration ID", "City", "Service Name", "Car No", "Delivered Date", "Amount_WO_gst", "total Gmv"]
+
+MEASURES = ["orders", "amount", "gmv"]
+
+
+# Per-source metrics for every source at once, built after each data load.
+#   cube:    (source, City, Service Name, dated) -> orders, amount, gmv
+#   sources: source -> orders, amount, gmv, repeat_orders, cities
+# "dated" separates rows with a parseable Delivered Date, which are the only ones
+# a date range filter can ever return.
+class Rollup:
+    def __init__(self, data, source_keys):
+        self.available = not data.empty and all(col in data.columns for col in ROLLUP_COLUMNS)
+        if not self.available:
+            self.cube = pd.DataFrame(columns=MEASURES)
+            self.sources = pd.DataFrame(columns=MEASURES + ["repeat_orders", "cities"])
+            return
+
+        keys = pd.Categorical(source_keys)
+        frame = pd.DataFrame({
+            "source": keys,
+            "City": data["City"].to_numpy(),
+            "Service Name": data["Service Name"].to_numpy(),
+            "dated": data["Delivered Date"].notna().to_numpy(),
+            "orders": data["Registration ID"].notna().to_numpy(),
+            "amount": data["Amount_WO_gst"].to_numpy(),
+            "gmv": data["total Gmv"].to_numpy(),
+        })
+        self.cube = frame.groupby(["source", "City", "Service Name", "dated"], observed=True, dropna=False)[MEASURES].sum()
+
+        sources = self.cube.groupby(level="source", observed=True).sum()
+        repeats = pd.DataFrame({"source": keys, "car": data["Car No"].to_numpy()}).duplicated()
+        sources["repeat_orders"] = repeats.groupby(keys, observed=True).sum()
+        cities = self.cube.index.droplevel(["Service Name", "dated"]).unique()
+        sources["cities"] = pd.Series(1, index=cities).groupby(level="source", observed=True).count()
+        self.sources = sources
+
+    def _slice(self, source_key):
+        if source_key not in self.sources.index:
+            return self.cube.iloc[0:0]
+        return self.cube.xs(source_key, level="source")
+
+    # Whole-source metrics as a dict, or None when the source has no rows
+    def summary(self, source_key):
+        if source_key not in self.sources.index:
+            return None
+        return self.sources.loc[source_key].to_dict()
+
+    # Orders per City or Service Name for one source, most orders first
+    def breakdown(self, source_key, by):
+        counts = self._slice(source_key)["orders"].groupby(level=by, observed=True).sum()
+        return counts[counts > 0].sort_values(ascending=False)
+
+    # Order count and amount sums for one source, optionally for one city and only
+    # for rows with a delivered date
+    def totals(self, source_key, city=None, dated_only=False):
+        cube = self._slice(source_key)
+        if city is not None:
+            cube = cube[cube.index.get_level_values("City") == city]
+        if dated_only:
+            cube = cube[cube.index.get_level_values("dated")]
+        return cube[MEASURES].sum().to_dict()
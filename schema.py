@@ -0,0 +1,87 @@
+import pandas as pd
+
+# Low-cardinality text columns stored as categoricals
+CATEGORY_COLUMNS = ["Source Name", "City", "Service Name"]
+
+# Columns parsed to datetime64; unparseable values become NaT
+DATE_COLUMNS = ["Delivered Date"]
+
+# Money columns; blanks and bad values become NaN so sums skip them
+NUMERIC_COLUMNS = ["Amount_WO_gst", "total Gmv"]
+
+# Identifiers that must stay text even when the sheet holds them as numbers
+STRING_COLUMNS = ["Registration ID"]
+
+
+def _to_numeric(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    # Amounts may be typed with thousands separators or a rupee sign
+    cleaned = column.astype(str).str.replace(r"[,₹\s]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+# Coerce a freshly loaded sheet to the dtypes the pages expect. Runs once per data
+# load, so page code no longer re-parses the same columns on every interaction.
+def normalize(data):
+    if data.empty:
+        return data
+    data = data.copy()
+    for column in STRING_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype(str)
+    for column in DATE_COLUMNS:
+        if column in data.columns:
+            data[column] = pd.to_datetime(data[column], errors="coerce")
+    for column in NUMERIC_COLUMNS:
+        if column in data.columns:
+            data[column] = _to_numeric(data[column])
+    for column in CATEGORY_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype(str).astype("category")
+    return data
+
+
+# Columns each consumer of the main sheet reads. Only these are kept in memory.
+PAGE_COLUMNS = {
+    "dashboard": ["Source Name", "Registration ID", "City", "Service Name", "Car Name", "Customer Name", "Car Model",
+                  "Car Odometer", "Car No", "Mobile No", "Invoice Link", "Delivered Date"],
+    "analytics": ["Source Name", "Registration ID", "City", "Service Name", "Car No"],
+    "show_data": ["Source Name", "Registration ID", "City", "Service Name", "Car Name",
+                  "Customer Name", "Car Odometer", "Car No", "Mobile No", "Delivered Date"],
+    "bill_data": ["Customer Name", "Registration ID", "City", "Service Name", "Car Name",
+                  "Car Odometer", "Car No", "Mobile No", "Delivered Date",
+                  "Amount_WO_gst", "total Gmv"],
+    "rollup": ["Registration ID", "City", "Service Name", "Car No", "Delivered Date", "Amount_WO_gst", "total Gmv"],
+}
+
+# Login passwords; loaded only to build the credential store, then dropped
+CREDENTIAL_COLUMNS = ["Password", "owner_password"]
+
+# Wide, rarely read columns; fetched from the backend on first use (Dataset.lazy_column)
+LAZY_COLUMNS = ["Invoice Link"]
+
+# Unique per order; lazily fetched values are matched to loaded rows on it, since
+# rows may have been inserted or deleted in the sheet since the load
+ROW_KEY = "Registration ID"
+
+
+def _loaded_columns():
+    wanted = []
+    for columns in list(PAGE_COLUMNS.values()) + [CREDENTIAL_COLUMNS]:
+        for column in columns:
+            if column not in wanted and column not in LAZY_COLUMNS:
+                wanted.append(column)
+    return wanted
+
+
+# Columns the loader fetches and keeps for the main sheet
+LOADED_COLUMNS = _loaded_columns()
+
+
+# The subset of header to keep, in sheet order; None keeps everything
+def project(header, columns):
+    if columns is None:
+        return list(header)
+    wanted = set(columns)
+    return [column for column in header if column in wanted]
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pyarrow as pa
+
+from credentials import restore_credentials
+from snapshot import create_private, from_table, make_private_dir, to_table
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) publishing is only serialized within a process
+    fcntl = None
+
+# Directory where loaded datasets are published for every worker process on the host.
+# Empty (the default) keeps each process on its own copy.
+SHARED_DIR = os.environ.get("SHARED_DATASET_DIR", "")
+
+# Published versions kept on disk; older files are removed once nobody should need them
+KEEP_VERSIONS = 2
+
+_META_KEY = b"shared_dataset"
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def enabled():
+    return bool(SHARED_DIR)
+
+
+def _base(key):
+    digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SHARED_DIR, digest)
+
+
+def _pointer_path(key):
+    return f"{_base(key)}.json"
+
+
+def _data_path(key, version):
+    return f"{_base(key)}.{version}.arrow"
+
+
+# Published files hold the credential salt and hashes, so they are created readable
+# by the app's user alone, in a directory only it can list
+def _write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    create_private(tmp_path)
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+# Held while a process checks the published version and, if needed, fetches and
+# publishes a new one, so one worker downloads the sheet while the others wait and
+# then attach its result.
+@contextmanager
+def publish_lock(key):
+    with _thread_locks_lock:
+        thread_lock = _thread_locks.setdefault(key, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        make_private_dir(SHARED_DIR)
+        with open(f"{_base(key)}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# The pointer to the current version: {"version", "file", "checked_at"}, or None
+def current(key):
+    try:
+        with open(_pointer_path(key), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Changes whenever a version is published or re-confirmed; a cheap check per request
+def pointer_mtime(key):
+    try:
+        return os.stat(_pointer_path(key)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _write_pointer(key, pointer):
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(pointer, f)
+    _write_atomic(_pointer_path(key), write)
+
+
+# Write a normalized frame and its credential store as an uncompressed Arrow IPC file,
+# then swap the pointer to it. Readers see either the old or the new version.
+def publish(key, version, data, credentials):
+    make_private_dir(SHARED_DIR)
+    table, mixed = to_table(data)
+    meta = {"version": version, "mixed_columns": mixed, "credentials": credentials.state()}
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _META_KEY: json.dumps(meta).encode("utf-8"),
+    })
+
+    def write(path):
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    path = _data_path(key, version)
+    _write_atomic(path, write)
+    _write_pointer(key, {"version": version, "file": os.path.basename(path), "checked_at": time.time()})
+    _remove_old(key, version)
+
+
+# Record that the published version was checked against the source and is current;
+# checked_at=0 marks it stale for every process instead
+def touch(key, checked_at=None):
+    pointer = current(key)
+    if pointer is not None:
+        pointer["checked_at"] = time.time() if checked_at is None else checked_at
+        _write_pointer(key, pointer)
+
+
+def _remove_old(key, version):
+    prefix = os.path.basename(_base(key)) + "."
+    versions = []
+    for name in os.listdir(SHARED_DIR):
+        if name.startswith(prefix) and name.endswith(".arrow"):
+            try:
+                versions.append(int(name[len(prefix):-len(".arrow")]))
+            except ValueError:
+                continue
+    for old in sorted(v for v in versions if v < version)[:-(KEEP_VERSIONS - 1) or None]:
+        try:
+            os.remove(_data_path(key, old))
+        except OSError:
+            # Still mapped by a reader on a platform that forbids removing it
+            pass
+
+
+# Memory-map the published version named by pointer. Returns (frame, credentials),
+# or None when the file has already been replaced. Columns without conversions are
+# views of the mapped file, so every process shares the same pages of memory.
+def attach(key, pointer):
+    try:
+        source = pa.memory_map(os.path.join(SHARED_DIR, pointer["file"]))
+        table = pa.ipc.open_file(source).read_all()
+    except (OSError, KeyError, pa.ArrowException):
+        return None
+    meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+    if meta.get("version") != pointer["version"]:
+        return None
+    return from_table(table, meta.get("mixed_columns", [])), restore_credentials(meta["credentials"])
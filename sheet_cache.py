@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+from itertools import count
+
+import metrics
+import shared_store
+import snapshot
+from dataset import Dataset
+from backends import SheetsBackend, get_backend
+from google_sheets import IncrementalSheet
+
+# Seconds a loaded sheet is served as fresh before a background refresh starts
+DEFAULT_TTL = int(os.environ.get("SHEET_CACHE_TTL", 300))
+
+# Seconds to wait before retrying after a failed background refresh
+RETRY_DELAY = 30
+
+# "incremental" fetches only appended rows on refresh, "full" re-downloads the sheet
+SYNC_MODE = os.environ.get("SHEET_SYNC_MODE", "incremental")
+
+_lock = threading.Lock()
+_entries = {}
+_load_locks = {}
+_syncers = {}
+# Columns kept for each key (see schema.LOADED_COLUMNS); missing means all
+_columns = {}
+_versions = count(1)
+
+
+# version is set when the entry is shared between processes; see _load_shared
+class CacheEntry:
+    def __init__(self, data, key, version=None, credentials=None):
+        self.version = next(_versions) if version is None else version
+        # Indexes are built here, on the loading thread, not during page renders
+        self.dataset = Dataset(data, self.version, backend=_backend(key), sheet_name=key[2],
+                               credentials=credentials)
+        self.loaded_at = time.time()
+        self.retry_at = 0
+        self.refreshing = False
+        self.last_error = None
+        # True while serving a local snapshot that has not been reconciled yet
+        self.from_snapshot = False
+        # Modification time of the shared pointer this entry was last checked against
+        self.shared_mtime = None
+
+    def is_stale(self, ttl):
+        return time.time() - self.loaded_at > ttl
+
+
+def _key(json_keyfile, spreadsheet_url, sheet_name):
+    return (json_keyfile, spreadsheet_url, sheet_name)
+
+
+def _load_lock(key):
+    with _lock:
+        return _load_locks.setdefault(key, threading.Lock())
+
+
+def _syncer(key):
+    syncer = _syncers.get(key)
+    if syncer is None:
+        syncer = _syncers[key] = IncrementalSheet(*key, columns=_columns.get(key))
+    return syncer
+
+
+# Returns (frame, changed). The frame is only skipped when nothing changed and the
+# caller already has the data (cached). Callers hold the key's load lock.
+def _fetch(key, cached):
+    backend = _backend(key)
+    if not isinstance(backend, SheetsBackend) or SYNC_MODE != "incremental":
+        data, changed = backend.sync(key[2], _columns.get(key))
+        if data is None and not cached:
+            data = backend.load(key[2], _columns.get(key))
+        return data, changed
+    return _syncer(key).sync()
+
+
+def _backend(key):
+    return get_backend(key[0], key[1])
+
+
+# The shared store persists across restarts itself, so it replaces snapshots
+def _uses_snapshots(key):
+    return isinstance(_backend(key), SheetsBackend) and not shared_store.enabled()
+
+
+# The entry's dataset is saved rather than the fetched frame, so password columns
+# never reach the disk
+def _save_snapshot(key, entry):
+    if not _uses_snapshots(key):
+        return
+    try:
+        snapshot.save_snapshot(key, entry.dataset.data, entry.dataset.credentials, _columns.get(key))
+    except Exception:
+        # A failed snapshot only costs the next cold start, never the current load
+        pass
+
+
+# Serve the last local snapshot on a cold start. The entry is marked stale so the
+# first read reconciles it with the live sheet in the background. The snapshot holds
+# normalized data without the password columns, which incremental appends cannot be
+# added to, so that first reconcile is a full reload.
+def _load_from_snapshot(key):
+    if not _uses_snapshots(key):
+        return None
+    try:
+        loaded = snapshot.load_snapshot(key)
+    except Exception:
+        return None
+    if loaded is None:
+        return None
+    data, credentials, meta = loaded
+    if meta.get("columns") != _columns.get(key):
+        # Saved with a different column projection; a fresh load is needed
+        return None
+    entry = CacheEntry(data, key, credentials=credentials)
+    entry.loaded_at = 0
+    entry.from_snapshot = True
+    with _lock:
+        _entries[key] = entry
+    return entry
+
+
+def _mark_fresh(entry, loaded_at=None):
+    entry.loaded_at = time.time() if loaded_at is None else loaded_at
+    entry.retry_at = 0
+    entry.refreshing = False
+    entry.from_snapshot = False
+
+
+def _load(key, ttl=None):
+    with metrics.timer("sheet_load_seconds", sheet=key[2]):
+        return _load_entry(key, ttl)
+
+
+# Fetch the sheet and store it as the current entry for the key. When the sync found
+# nothing new the existing entry is kept, so its indexes are not rebuilt.
+def _load_entry(key, ttl):
+    if shared_store.enabled():
+        return _load_shared(key, DEFAULT_TTL if ttl is None else ttl)
+    with _lock:
+        entry = _entries.get(key)
+    data, changed = _fetch(key, entry is not None)
+    if not changed and entry is not None:
+        _mark_fresh(entry)
+        return entry
+    entry = CacheEntry(data, key)
+    with _lock:
+        _entries[key] = entry
+    _save_snapshot(key, entry)
+    return entry
+
+
+# Build an entry from the version another process published
+def _attach(key, pointer):
+    attached = shared_store.attach(key, pointer)
+    if attached is None:
+        return None
+    data, credentials = attached
+    entry = CacheEntry(data, key, version=pointer["version"], credentials=credentials)
+    entry.loaded_at = pointer["checked_at"]
+    with _lock:
+        _entries[key] = entry
+    return entry
+
+
+# With a shared store, worker processes take turns under a file lock: whoever finds
+# the published version stale fetches the sheet and publishes the result, the others
+# attach it. Versions are nanosecond timestamps so they stay ordered across processes.
+def _load_shared(key, ttl):
+    with shared_store.publish_lock(key):
+        pointer = shared_store.current(key)
+        mtime = shared_store.pointer_mtime(key)
+        with _lock:
+            entry = _entries.get(key)
+        if pointer is not None and (entry is None or pointer["version"] > entry.version):
+            entry = _attach(key, pointer) or entry
+        if entry is not None and pointer is not None and entry.version == pointer["version"]:
+            entry.shared_mtime = mtime
+            if time.time() - pointer["checked_at"] <= ttl:
+                _mark_fresh(entry, pointer["checked_at"])
+                return entry
+
+        data, changed = _fetch(key, entry is not None)
+        if not changed and entry is not None:
+            _mark_fresh(entry)
+            if pointer is not None and entry.version == pointer["version"]:
+                shared_store.touch(key)
+                entry.shared_mtime = shared_store.pointer_mtime(key)
+            return entry
+        entry = CacheEntry(data, key, version=time.time_ns())
+        try:
+            shared_store.publish(key, entry.version, entry.dataset.data, entry.dataset.credentials)
+            entry.shared_mtime = shared_store.pointer_mtime(key)
+        except Exception:
+            # Other workers fetch for themselves until a publish succeeds
+            pass
+        with _lock:
+            _entries[key] = entry
+        return entry
+
+
+# Runs on a daemon thread; on failure the stale entry keeps being served
+def _refresh(key, entry, ttl):
+    try:
+        with _load_lock(key):
+            _load(key, ttl)
+    except Exception as e:
+        with _lock:
+            entry.last_error = e
+            entry.retry_at = time.time() + RETRY_DELAY
+            entry.refreshing = False
+
+
+def _start_refresh(key, entry, ttl):
+    with _lock:
+        if entry.refreshing or time.time() < entry.retry_at:
+            return
+        entry.refreshing = True
+    thread = threading.Thread(target=_refresh, args=(key, entry, ttl), daemon=True, name="sheet-cache-refresh")
+    thread.start()
+
+
+# Return the cached entry for a sheet, loading it only when nothing is cached yet.
+# Stale entries are returned immediately while a background thread reloads them.
+# columns limits what is fetched and kept for the sheet; it is fixed by the first call.
+def get_entry(json_keyfile, spreadsheet_url, sheet_name, ttl=None, columns=None):
+    ttl = DEFAULT_TTL if ttl is None else ttl
+    key = _key(json_keyfile, spreadsheet_url, sheet_name)
+    if columns is not None:
+        with _lock:
+            _columns.setdefault(key, list(columns))
+
+    with _lock:
+        entry = _entries.get(key)
+
+    if entry is None:
+        # Cold start: concurrent sessions wait on the same load instead of each fetching
+        with _load_lock(key):
+            with _lock:
+                entry = _entries.get(key)
+            if entry is None:
+                entry = _load_from_snapshot(key)
+            if entry is None:
+                metrics.inc("cache_requests_total", cache="sheet", result="miss")
+                return _load(key, ttl)
+        if not entry.from_snapshot:
+            metrics.inc("cache_requests_total", cache="sheet", result="hit")
+            return entry
+
+    stale = entry.is_stale(ttl)
+    metrics.inc("cache_requests_total", cache="sheet", result="stale" if stale else "hit")
+    # Another worker published a newer version: swap to it in the background
+    if stale or (shared_store.enabled() and shared_store.pointer_mtime(key) != entry.shared_mtime):
+        _start_refresh(key, entry, ttl)
+    return entry
+
+
+def get_data(json_keyfile, spreadsheet_url, sheet_name, ttl=None, columns=None):
+    return get_entry(json_keyfile, spreadsheet_url, sheet_name, ttl, columns).dataset.data
+
+
+def get_dataset(json_keyfile, spreadsheet_url, sheet_name, ttl=None, columns=None):
+    return get_entry(json_keyfile, spreadsheet_url, sheet_name, ttl, columns).dataset
+
+
+# Mark cached sheets as stale so the next read triggers a refresh.
+# With drop=True the entries are removed and the next read blocks on a fresh load.
+def invalidate(json_keyfile=None, spreadsheet_url=None, sheet_name=None, drop=False):
+    wanted = _key(json_keyfile, spreadsheet_url, sheet_name)
+    with _lock:
+        for key in list(_entries):
+            if all(w is None or w == k for w, k in zip(wanted, key)):
+                if drop:
+                    del _entries[key]
+                    _syncers.pop(key, None)
+                else:
+                    _entries[key].loaded_at = 0
+                    _entries[key].retry_at = 0
+                if shared_store.enabled():
+                    shared_store.touch(key, checked_at=0)
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from concurrent import futures
+
+from sheet_cache import get_dataset
+
+# Seconds a page waits for one worksheet before reporting it as failed. A fetch that
+# times out while still queued is cancelled; one that already started keeps running
+# and fills the cache for the next run.
+DEFAULT_TIMEOUT = float(os.environ.get("SHEET_FETCH_TIMEOUT", 30))
+
+# Worksheets fetched at the same time; gspread calls block, so these are threads
+MAX_WORKERS = int(os.environ.get("SHEET_FETCH_WORKERS", 8))
+
+_executor = futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="sheet-fetch")
+
+# Unfinished fetches by _key(spec), so reruns wait on a load already in flight
+# instead of queueing another one behind it, and how many callers wait on each.
+# Reentrant because cancel() runs _forget in the calling thread.
+_lock = threading.RLock()
+_in_flight = {}
+_waiters = {}
+
+
+# One worksheet to load. columns limits what is kept (see schema.LOADED_COLUMNS);
+# timeout defaults to DEFAULT_TIMEOUT.
+class SheetSpec:
+    def __init__(self, json_keyfile, spreadsheet_url, sheet_name, columns=None, timeout=None, ttl=None):
+        self.json_keyfile = json_keyfile
+        self.spreadsheet_url = spreadsheet_url
+        self.sheet_name = sheet_name
+        self.columns = columns
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self.ttl = ttl
+
+
+# Outcome for one worksheet: dataset is None when error is set
+class SheetResult:
+    def __init__(self, dataset=None, error=None, elapsed=0.0):
+        self.dataset = dataset
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _load(spec):
+    started = time.monotonic()
+    dataset = get_dataset(spec.json_keyfile, spec.spreadsheet_url, spec.sheet_name, spec.ttl, spec.columns)
+    return dataset, time.monotonic() - started
+
+
+def _key(spec):
+    columns = tuple(spec.columns) if spec.columns is not None else None
+    return spec.json_keyfile, spec.spreadsheet_url, spec.sheet_name, columns, spec.ttl
+
+
+# The running or queued fetch of spec, submitting one when there is none. Every call
+# must be paired with _release.
+def _submit(spec):
+    key = _key(spec)
+    with _lock:
+        future = _in_flight.get(key)
+        if future is None or future.done():
+            future = _executor.submit(_load, spec)
+            _in_flight[key] = future
+            future.add_done_callback(lambda f: _forget(key, f))
+        _waiters[future] = _waiters.get(future, 0) + 1
+        return future
+
+
+# Stop waiting on future. The last caller to give up on a fetch that never started
+# cancels it, which frees its worker slot.
+def _release(future, timed_out=False):
+    with _lock:
+        count = _waiters.pop(future, 1) - 1
+        if count > 0:
+            _waiters[future] = count
+        elif timed_out:
+            future.cancel()
+
+
+def _forget(key, future):
+    with _lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+# Load a declared set of worksheets concurrently through the shared sheet cache and
+# authorized clients. specs maps a name to a SheetSpec; returns {name: SheetResult}.
+# Each sheet gets its own timeout counted from the common start, so the call takes
+# as long as the slowest sheet, and one failing sheet does not fail the others.
+def load_sheets(specs):
+    started = time.monotonic()
+    pending = {name: _submit(spec) for name, spec in specs.items()}
+    results = {}
+    for name, future in pending.items():
+        spec = specs[name]
+        remaining = max(0.0, started + spec.timeout - time.monotonic())
+        try:
+            dataset, elapsed = future.result(timeout=remaining)
+        except futures.TimeoutError:
+            _release(future, timed_out=True)
+            error = TimeoutError(f"{spec.sheet_name!r} did not load within {spec.timeout:g} seconds")
+            results[name] = SheetResult(error=error, elapsed=time.monotonic() - started)
+        except Exception as e:
+            _release(future)
+            results[name] = SheetResult(error=e, elapsed=time.monotonic() - started)
+        else:
+            _release(future)
+            results[name] = SheetResult(dataset, elapsed=elapsed)
+    return results
@@ -2,6 +2,12 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
+import export
+import metrics
+import reports
+from schema import PAGE_COLUMNS
+from table_view import show_table
+
 # Custom HTML for styling
 custom_html = """
 <style>
@@ -54,26 +60,18 @@ custom_html = """
 </style>
 """
 
-def show(source_name, data):
+def show(source_name, dataset):
+    # Stage timings for the diagnostics page (see metrics.py)
+    timer = metrics.StageTimer("show_data")
     source_name = source_name.lower()
 
     st.markdown(custom_html, unsafe_allow_html=True)  # Apply custom styles
     st.markdown("<div class='title'>📊 Show Data</div>", unsafe_allow_html=True)  # Custom title header
 
-    # Filter data for the selected source name
-    data_filter = data[data["Source Name"].str.lower() == source_name].copy()
-    data_filter["Registration ID"] = data_filter["Registration ID"].astype(str)
-
-    required_columns = [
-        "Source Name", "Registration ID", "City", "Service Name", "Car Name",
-        "Customer Name", "Car Odometer", "Car No", "Mobile No", "Delivered Date"
-    ]
-
-    # Ensure Delivered Date is datetime
-    data_filter["Delivered Date"] = pd.to_datetime(data_filter["Delivered Date"], errors='coerce')
-    data_filter = data_filter[required_columns]
+    # Rows are selected in reports.py; column types are normalized at load time (see schema.py)
+    required_columns = PAGE_COLUMNS["show_data"]
 
-    if data_filter.empty:
+    if not dataset.has_source(source_name):
         st.markdown("<div class='warning'>No data found for source: **{source_name}**</div>", unsafe_allow_html=True)
         return
 
@@ -81,7 +79,7 @@ def show(source_name, data):
     st.markdown("<h4 style='color: blue;'>Search Options:</h4>", unsafe_allow_html=True)
 
     # Dropdown to select search type
-    un_city = data_filter["City"].unique()
+    un_city = reports.cities(dataset, source_name)
     search_type = st.selectbox(
         "Select an option",
         options=["Select an option", "All Cities"] + list(un_city),
@@ -91,10 +89,10 @@ def show(source_name, data):
     )
 
     if search_type == "All Cities":
-        filtered_data = data_filter
+        city = None
         st.markdown("<p style='color: green;'>Showing data for all cities.</p>", unsafe_allow_html=True)
     elif search_type in un_city:
-        filtered_data = data_filter[data_filter["City"] == search_type]
+        city = search_type
         st.markdown(f"<p style='color: green;'>Showing data for city: <b>{search_type}</b></p>", unsafe_allow_html=True)
     else:
         st.markdown("<p style='color: red;'>Please select a valid search option.</p>", unsafe_allow_html=True)
@@ -102,19 +100,26 @@ def show(source_name, data):
 
     # Date range filtering
     st.markdown("<h4 style='color: blue;'>Filter by Date Range:</h4>", unsafe_allow_html=True)
+    first_date, last_date = reports.date_bounds(dataset, source_name, city)
+    if pd.isna(first_date):
+        st.markdown("<div class='warning'>No delivered dates found for this selection.</div>", unsafe_allow_html=True)
+        return
+
     start_date, end_date = st.columns(2)
 
     with start_date:
-        start_date_value = st.date_input("Start Date", filtered_data['Delivered Date'].min().date(), format="DD-MM-YYYY")
+        start_date_value = st.date_input("Start Date", first_date.date(), format="DD-MM-YYYY")
     with end_date:
-        end_date_value = st.date_input("End Date", filtered_data['Delivered Date'].max().date(), format="DD-MM-YYYY")
+        end_date_value = st.date_input("End Date", last_date.date(), format="DD-MM-YYYY")
+    timer.lap("filters")
 
     if start_date_value > end_date_value:
         st.markdown("<div class='error'>Start date must be earlier than or equal to end date.</div>", unsafe_allow_html=True)
     else:
-        mask = (filtered_data['Delivered Date'] >= pd.to_datetime(start_date_value)) & \
-               (filtered_data['Delivered Date'] <= pd.to_datetime(end_date_value))
-        date_filtered_data = filtered_data[mask]
+        # Only the matching rows and columns are taken
+        date_filtered_data = reports.filtered_rows(dataset, source_name, city, start_date_value, end_date_value,
+                                                   columns=required_columns)
+        timer.lap("query")
 
         if date_filtered_data.empty:
             st.markdown(f"<div class='warning'>No data found between {start_date_value.strftime('%d-%m-%Y')} and {end_date_value.strftime('%d-%m-%Y')}.</div>", unsafe_allow_html=True)
@@ -124,15 +129,20 @@ def show(source_name, data):
                 unsafe_allow_html=True
             )
 
-            st.dataframe(date_filtered_data, use_container_width=True)
+            # Only the visible page is sent to the browser
+            show_table(date_filtered_data, key="show_data")
+            timer.lap("table")
 
-            # Download Button
-            csv = date_filtered_data.to_csv(index=False)
+            # Download Button; the file is only built when the button is clicked and
+            # reused for the same source, filters and data version
+            export_format = st.selectbox("Download format", options=list(export.FORMATS), key="export_format")
+            export_key = (source_name, city, start_date_value, end_date_value, dataset.version)
             st.download_button(
-                label="Download Filtered Data as Excel",
-                data=csv,
-                file_name=f"filtered_data_{datetime.now().strftime('%d%m%y')}.csv",
-                mime="text/csv",
+                label=f"Download Filtered Data as {export_format}",
+                data=export.deferred_export(export_key, date_filtered_data, export_format),
+                file_name=export.file_name(f"filtered_data_{datetime.now().strftime('%d%m%y')}", export_format),
+                mime=export.mime_type(export_format),
                 help="Click to download the filtered data."
             )
+            timer.lap("export")
 
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+from gspread.utils import numericise
+
+from credentials import restore_credentials
+
+# Bump when the snapshot layout changes; older files are then ignored
+SCHEMA_VERSION = 2
+
+# Directory for local snapshots of loaded sheets; set to "" to disable them
+SNAPSHOT_DIR = os.environ.get("SHEET_SNAPSHOT_DIR", ".snapshots")
+
+_META_KEY = b"sheet_snapshot"
+
+
+def enabled():
+    return bool(SNAPSHOT_DIR)
+
+
+# Snapshots hold credential hashes, so only the app's own user may read them
+def make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    os.chmod(path, 0o700)
+
+
+# Create an empty file readable by the app's user alone, before anything is written to it
+def create_private(path):
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+
+
+def snapshot_path(key):
+    digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{digest}.feather")
+
+
+# Sheet columns mixing numbers and blank strings cannot be stored as one Arrow type;
+# they are written as text and numericised again on load, like get_all_records does.
+# Returns (table, mixed column names).
+def to_table(data):
+    mixed = []
+    for column in data.columns:
+        if data[column].dtype == object:
+            try:
+                pa.array(data[column], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                mixed.append(column)
+    if mixed:
+        data = data.copy()
+        for column in mixed:
+            data[column] = data[column].astype(str)
+    return pa.Table.from_pandas(data, preserve_index=False), mixed
+
+
+# Write a normalized frame and its credential store atomically, with the schema
+# version, save time and the column projection it was loaded with. Plaintext password
+# columns are never written; the file is only readable by the app's user.
+def save_snapshot(key, data, credentials, columns=None):
+    if not enabled():
+        return None
+    make_private_dir(SNAPSHOT_DIR)
+    table, mixed = to_table(data)
+    meta = {
+        "schema_version": SCHEMA_VERSION,
+        "saved_at": time.time(),
+        "key": list(key),
+        "mixed_columns": mixed,
+        "columns": columns,
+        "credentials": credentials.state(),
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _META_KEY: json.dumps(meta).encode("utf-8"),
+    })
+    path = snapshot_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    create_private(tmp_path)
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    return path
+
+
+# Returns (frame, credentials, meta) or None when there is no usable snapshot for the key
+def load_snapshot(key):
+    if not enabled():
+        return None
+    path = snapshot_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        # Uncompressed Feather can be memory-mapped instead of read into memory
+        table = feather.read_table(path, memory_map=True)
+        meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+    if meta.get("schema_version") != SCHEMA_VERSION or meta.get("key") != list(key):
+        return None
+
+    return from_table(table, meta.get("mixed_columns", [])), restore_credentials(meta["credentials"]), meta
+
+
+# Inverse of to_table. split_blocks keeps columns that need no conversion pointing at
+# the table's buffers, which matters when the table is memory-mapped.
+def from_table(table, mixed):
+    data = table.to_pandas(split_blocks=True)
+    for column in mixed:
+        data[column] = data[column].map(numericise).astype(object)
+    return data
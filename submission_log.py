@@ -0,0 +1,170 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# SQLite file holding every form submission until it is confirmed in the sheet
+LOG_PATH = os.environ.get("SUBMISSION_LOG_PATH", os.path.join(".data", "submissions.db"))
+
+# How long the committer waits for more submissions to share one fsync
+GROUP_COMMIT_WINDOW = 0.005
+
+# Seconds a process's claim on its unwritten rows lasts unless renewed (see claim)
+LEASE_SECONDS = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    sheet TEXT NOT NULL,
+    row TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    written_at REAL,
+    failed_at REAL,
+    error TEXT,
+    claimed_by TEXT,
+    claimed_until REAL
+)
+"""
+
+# Columns added after the first release, for logs created before them
+_ADDED_COLUMNS = {"claimed_by": "TEXT", "claimed_until": "REAL"}
+
+
+def new_submission_id():
+    return uuid.uuid4().hex
+
+
+# Append-only local log of submissions, in SQLite WAL mode with synchronous=FULL so a
+# row is on disk before the form reports success. Concurrent appends are grouped into
+# one transaction by a committer thread, so many submits share a single fsync.
+#
+# Several worker processes can share one log. Each row is claimed by the process that
+# is to write it (owner), so no two processes send the same row; rows of a process that
+# stopped renewing its claims are taken over by the next claim() after the lease ends.
+class SubmissionLog:
+    def __init__(self, path=LOG_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(_SCHEMA)
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(submissions)")}
+        for column, kind in _ADDED_COLUMNS.items():
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE submissions ADD COLUMN {column} {kind}")
+        self._db_lock = threading.Lock()
+        # Identifies this process's claims
+        self.owner = uuid.uuid4().hex
+
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._thread = threading.Thread(target=self._commit_loop, daemon=True, name="submission-log")
+        self._thread.start()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._waiting:
+                    self._cond.wait()
+            time.sleep(GROUP_COMMIT_WINDOW)
+            with self._cond:
+                group, self._waiting = self._waiting, []
+            error = None
+            try:
+                claim = (self.owner, time.time() + LEASE_SECONDS)
+                self._transaction(
+                    "INSERT OR IGNORE INTO submissions (id, sheet, row, created_at, claimed_by, claimed_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [record + claim for record, _ in group],
+                )
+            except sqlite3.Error as e:
+                error = e
+            for _, done in group:
+                done["error"] = error
+                done["event"].set()
+
+    # Run one statement for many parameter tuples in a single transaction
+    def _transaction(self, sql, params):
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(sql, params)
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # Durably record a row for a sheet, claimed by this process, and return its
+    # submission ID. Blocks until the group commit containing it is on disk; raises if
+    # the commit failed.
+    def append(self, sheet, row, submission_id=None):
+        submission_id = submission_id or new_submission_id()
+        done = {"event": threading.Event(), "error": None}
+        record = (submission_id, sheet, json.dumps(list(row)), time.time())
+        with self._cond:
+            self._waiting.append((record, done))
+            self._cond.notify()
+        done["event"].wait()
+        if done["error"] is not None:
+            raise done["error"]
+        return submission_id
+
+    # Renew this process's claims and claim the sheet's unwritten rows nobody holds
+    # (never claimed, or the lease ran out), in one transaction. Returns the newly
+    # claimed rows, oldest first: [(id, row, attempts)]
+    def claim(self, sheet):
+        now = time.time()
+        with self._db_lock:
+            # IMMEDIATE takes the write lock up front, so two processes cannot claim the same rows
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "UPDATE submissions SET claimed_until = ? "
+                    "WHERE claimed_by = ? AND written_at IS NULL AND failed_at IS NULL",
+                    (now + LEASE_SECONDS, self.owner),
+                )
+                rows = self._db.execute(
+                    "SELECT id, row, attempts FROM submissions "
+                    "WHERE sheet = ? AND written_at IS NULL AND failed_at IS NULL "
+                    "AND (claimed_by IS NULL OR claimed_until < ?) ORDER BY created_at",
+                    (sheet, now),
+                ).fetchall()
+                self._db.executemany("UPDATE submissions SET claimed_by = ?, claimed_until = ? WHERE id = ?",
+                                     [(self.owner, now + LEASE_SECONDS, row[0]) for row in rows])
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+        return [(submission_id, json.loads(row), attempts) for submission_id, row, attempts in rows]
+
+    def mark_attempted(self, ids):
+        self._transaction("UPDATE submissions SET attempts = attempts + 1 WHERE id = ?",
+                          [(submission_id,) for submission_id in ids])
+
+    def mark_written(self, ids):
+        now = time.time()
+        self._transaction("UPDATE submissions SET written_at = ? WHERE id = ?",
+                          [(now, submission_id) for submission_id in ids])
+
+    def mark_failed(self, ids, error):
+        now = time.time()
+        self._transaction("UPDATE submissions SET failed_at = ?, error = ? WHERE id = ?",
+                          [(now, str(error), submission_id) for submission_id in ids])
+
+
+_lock = threading.Lock()
+_logs = {}
+
+
+def get_log(path=LOG_PATH):
+    with _lock:
+        log = _logs.get(path)
+        if log is None:
+            log = _logs[path] = SubmissionLog(path)
+        return log
@@ -0,0 +1,36 @@
+import streamlit as st
+
+from reports import page_count, table_page
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+# Render one page of a frame. Sorting and slicing happen in reports.table_page, so only
+# the visible rows are serialized and sent to the browser whatever the size of the frame.
+def show_table(data, key, default_sort=None, use_container_width=True, date_format=None):
+    columns = list(data.columns)
+
+    sort_col, order_col, size_col, page_col = st.columns([3, 2, 2, 2])
+    with sort_col:
+        sort_by = st.selectbox(
+            "Sort by",
+            options=["(default order)"] + columns,
+            index=columns.index(default_sort) + 1 if default_sort in columns else 0,
+            key=f"{key}_sort_by",
+        )
+    with order_col:
+        descending = st.selectbox("Order", options=["Ascending", "Descending"], key=f"{key}_order") == "Descending"
+    with size_col:
+        page_size = st.selectbox("Rows per page", options=PAGE_SIZES, key=f"{key}_page_size")
+    pages = page_count(len(data), page_size)
+    # A narrower filter can leave the remembered page past the end
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    with page_col:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+
+    view = table_page(data, page, page_size, sort_by=sort_by, descending=descending, date_format=date_format)
+    st.dataframe(view.rows, use_container_width=use_container_width)
+    st.caption(f"Rows {view.start + 1 if view.total else 0}–{view.end} of {view.total} "
+               f"(page {view.page} of {view.page_count})")
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from plate_index import normalize_plate, normalize_plates
+
+DATE_COLUMN = "Delivered Date"
+ODOMETER_COLUMN = "Car Odometer"
+
+# Columns an index is built from
+VEHICLE_COLUMNS = ["Car No", DATE_COLUMN, ODOMETER_COLUMN]
+
+# Windows (days) for the return rates reported with every index
+RETURN_WINDOWS = (30, 90)
+
+
+# Visit history of every car in a source partition, keyed by normalized Car No.
+# Rows are sorted once by (plate, delivered date), so a car's history is a slice,
+# and the per-car summary and the return intervals come out of the same pass.
+#   vehicles: plate -> visits, first_date, last_date, first_odometer, last_odometer,
+#             km_per_day (odometer trend between the first and last dated visit)
+# Rows without a delivered date sort last within their car.
+class VehicleIndex:
+    def __init__(self, partition):
+        count = len(partition)
+        plates = normalize_plates(partition["Car No"]) if count else np.array([], dtype="U")
+        if DATE_COLUMN in partition.columns:
+            dates = partition[DATE_COLUMN].to_numpy(dtype="datetime64[ns]")
+        else:
+            dates = np.full(count, np.datetime64("NaT"), dtype="datetime64[ns]")
+        if ODOMETER_COLUMN in partition.columns:
+            odometer = pd.to_numeric(partition[ODOMETER_COLUMN], errors="coerce").to_numpy(dtype=float)
+        else:
+            odometer = np.full(count, np.nan)
+
+        # NaT compares as the smallest datetime64, so sort undated rows on a flag first
+        undated = np.isnat(dates)
+        order = np.lexsort((dates, undated, plates))
+        self._positions = order
+        self._plates = plates[order]
+        dates, undated, odometer = dates[order], undated[order], odometer[order]
+
+        self.plates, starts, counts = np.unique(self._plates, return_index=True, return_counts=True)
+        self._starts = starts
+        self._counts = counts
+        self.vehicles = self._summarize(starts, counts, dates, undated, odometer)
+        self._gaps, self._gap_dates, self.last_date = self._return_gaps(dates, undated)
+
+    def _summarize(self, starts, counts, dates, undated, odometer):
+        if not len(starts):
+            return pd.DataFrame(columns=["visits", "first_date", "last_date", "first_odometer",
+                                         "last_odometer", "km_per_day"])
+        # Dated rows lead each car's slice, so its last dated visit is start + dated - 1
+        dated = np.add.reduceat((~undated).astype(int), starts)
+        last = starts + np.maximum(dated, 1) - 1
+        first_date = np.where(dated > 0, dates[starts], np.datetime64("NaT"))
+        last_date = np.where(dated > 0, dates[last], np.datetime64("NaT"))
+        first_odometer = odometer[starts]
+        last_odometer = odometer[last]
+        days = (last_date - first_date) / np.timedelta64(1, "D")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            km_per_day = np.where(days > 0, (last_odometer - first_odometer) / days, np.nan)
+        return pd.DataFrame({
+            "visits": counts,
+            "first_date": first_date,
+            "last_date": last_date,
+            "first_odometer": first_odometer,
+            "last_odometer": last_odometer,
+            "km_per_day": km_per_day,
+        }, index=pd.Index(self.plates, name="plate"))
+
+    # Days from each dated visit to the same car's next dated visit (NaN when there is
+    # none), with the visit dates, for the return rates
+    def _return_gaps(self, dates, undated):
+        dated = ~undated
+        if not dated.any():
+            return np.array([]), np.array([], dtype="datetime64[ns]"), pd.NaT
+        plates, dates = self._plates[dated], dates[dated]
+        gaps = np.full(len(dates), np.nan)
+        same_car = plates[1:] == plates[:-1]
+        gaps[:-1][same_car] = ((dates[1:] - dates[:-1]) / np.timedelta64(1, "D"))[same_car]
+        return gaps, dates, pd.Timestamp(dates.max())
+
+    def __len__(self):
+        return len(self.plates)
+
+    # Position of a plate label or typed plate in self.plates, or None
+    def _find(self, plate):
+        key = normalize_plate(plate)
+        i = np.searchsorted(self.plates, key)
+        if i == len(self.plates) or self.plates[i] != key:
+            return None
+        return i
+
+    # Partition row positions of a car's visits, oldest first
+    def history(self, plate):
+        i = self._find(plate)
+        if i is None:
+            return np.array([], dtype=int)
+        return self._positions[self._starts[i]:self._starts[i] + self._counts[i]]
+
+    # Summary row for one car as a dict, or None when the car has no visits
+    def vehicle(self, plate):
+        i = self._find(plate)
+        return None if i is None else self.vehicles.iloc[i].to_dict()
+
+    # Share of dated visits after which the same car came back within days. Only visits
+    # at least days before the newest date count, so recent visits that have not had
+    # the chance to return do not lower the rate. None when no visit qualifies.
+    def return_rate(self, days):
+        if self.last_date is pd.NaT:
+            return None
+        eligible = self._gap_dates <= np.datetime64(self.last_date - pd.Timedelta(days=days))
+        if not eligible.any():
+            return None
+        returned = eligible & (self._gaps <= days)
+        return float(returned.sum() / eligible.sum())
+
+    def return_rates(self, windows=RETURN_WINDOWS):
+        return {days: self.return_rate(days) for days in windows}
+
+
+def empty_vehicle_index():
+    return VehicleIndex(pd.DataFrame({"Car No": pd.Series([], dtype=str)}))
@@ -0,0 +1,265 @@
+import random
+import threading
+import time
+
+from gspread.exceptions import APIError
+
+from google_sheets import api_call, api_status, client_manager, get_worksheet, needs_reset
+
+# Flush once this many rows are waiting...
+BATCH_SIZE = 20
+# ...or once the oldest waiting row is this many seconds old
+FLUSH_INTERVAL = 5.0
+
+# Backoff between failed flushes: BACKOFF_BASE * 2**attempt seconds, capped, with jitter
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Requests Google rejected outright (bad range, no access, sheet gone); sending them
+# again cannot succeed. Every other error, including quota and server errors and the
+# transport and token refresh errors of a network outage, is retried.
+PERMANENT_STATUS = {400, 403, 404}
+
+# Longest text Google Sheets accepts in one cell; longer values fail the whole append
+MAX_CELL_LENGTH = 50000
+
+# Seconds between renewing this process's claims in the submission log, which also
+# takes over rows left behind by stopped processes; well under its LEASE_SECONDS
+CLAIM_INTERVAL = 60.0
+
+
+def is_retryable(error):
+    return not (isinstance(error, APIError) and api_status(error) in PERMANENT_STATUS)
+
+
+# A queued row. submission_id is None when the queue has no submission log.
+class _Entry:
+    def __init__(self, row, submission_id=None, attempts=0):
+        self.row = row
+        self.submission_id = submission_id
+        self.attempts = attempts
+        # Set once the row is known to be in the sheet
+        self.written = False
+
+
+# Buffers rows for one worksheet and appends them with append_rows from a background
+# thread, in batches, so a busy form costs one Sheets call per batch instead of one
+# per submit. Rows stay queued and are retried with exponential backoff until they are
+# written; only rows Google rejects outright (PERMANENT_STATUS) are moved to failed.
+# A batch rejected as invalid is split until the offending rows are isolated, so one
+# bad row does not take the rest of its batch down with it.
+#
+# With a submission log, each row is first committed to the local log and written to
+# the sheet with its submission ID in column id_column. Unwritten rows are replayed
+# from the log on start-up and whenever their claim lapses (see SubmissionLog.claim),
+# so a process only sends rows it holds the claim on, and a batch that may already
+# have reached the sheet is checked against that column first, so nothing is lost or
+# appended twice.
+class WriteBehindQueue:
+    def __init__(self, json_keyfile, spreadsheet_url, sheet_name,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, log=None, id_column=None):
+        self.json_keyfile = json_keyfile
+        self.spreadsheet_url = spreadsheet_url
+        self.sheet_name = sheet_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.log = log
+        self.id_column = id_column
+        self.log_sheet = f"{spreadsheet_url}#{sheet_name}"
+
+        self._cond = threading.Condition()
+        # Held while a batch is written, so flush() and the queue thread never send the same rows
+        self._flush_lock = threading.Lock()
+        self._rows = []
+        self._oldest_at = None
+        self._attempt = 0
+        self._retry_at = 0
+        self.failed = []
+        self.last_error = None
+        self.written = 0
+        self._claimed_at = 0
+        self._claim()
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f"write-queue-{sheet_name}")
+        self._thread.start()
+
+    # Queue a row and return its submission ID (None without a log). With a log this
+    # returns once the row is durably on local disk.
+    def submit(self, row):
+        row = list(row)
+        submission_id = None
+        if self.log is not None:
+            submission_id = self.log.append(self.log_sheet, row)
+        with self._cond:
+            self._rows.append(_Entry(row, submission_id))
+            if self._oldest_at is None:
+                self._oldest_at = time.time()
+            self._cond.notify()
+        return submission_id
+
+    # Renew claims and queue the rows newly claimed from the log
+    def _claim(self):
+        if self.log is None:
+            return
+        claimed = self.log.claim(self.log_sheet)
+        with self._cond:
+            self._claimed_at = time.time()
+            queued = {entry.submission_id for entry in self._rows}
+            for submission_id, row, attempts in claimed:
+                if submission_id not in queued:
+                    self._rows.append(_Entry(row, submission_id, attempts))
+            if self._rows and self._oldest_at is None:
+                self._oldest_at = time.time()
+
+    def _claim_due(self, now):
+        return self.log is not None and now - self._claimed_at >= CLAIM_INTERVAL
+
+    def pending(self):
+        with self._cond:
+            return len(self._rows)
+
+    def _due(self, now):
+        if not self._rows or now < self._retry_at:
+            return False
+        return len(self._rows) >= self.batch_size or now - self._oldest_at >= self.flush_interval
+
+    def _wait_time(self, now):
+        due_times = []
+        if self._rows:
+            due_times.append(max(self._oldest_at + self.flush_interval, self._retry_at))
+        if self.log is not None:
+            due_times.append(self._claimed_at + CLAIM_INTERVAL)
+        if not due_times:
+            return None
+        return max(0.0, min(due_times) - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due(time.time()) and not self._claim_due(time.time()):
+                    self._cond.wait(self._wait_time(time.time()))
+            if self._claim_due(time.time()):
+                try:
+                    self._claim()
+                except Exception:
+                    # The log is busy or unreadable; try again at the next interval
+                    self._claimed_at = time.time()
+            with self._cond:
+                due = self._due(time.time())
+            if due:
+                self._flush_batch()
+
+    def _flush_batch(self):
+        with self._flush_lock:
+            with self._cond:
+                batch = self._rows[:self.batch_size]
+            if not batch:
+                return True
+            return self._write(batch)
+
+    def _sheet_row(self, entry):
+        if self.id_column is None or entry.submission_id is None:
+            return entry.row
+        row = entry.row + [""] * (self.id_column - 1 - len(entry.row))
+        return row[:self.id_column - 1] + [entry.submission_id]
+
+    # Entries of a batch that are not in the sheet yet. Only batches that were sent
+    # before (and may have landed despite the error) pay for reading the ID column.
+    def _not_yet_written(self, worksheet, batch):
+        if self.id_column is None or not any(entry.attempts for entry in batch):
+            return batch
+        existing = set(api_call("col_values", worksheet.col_values, self.id_column))
+        return [entry for entry in batch if entry.submission_id not in existing]
+
+    def _ids(self, batch):
+        return [entry.submission_id for entry in batch if entry.submission_id is not None]
+
+    # Append entries that are not written yet. Returns [(entry, error)] for the rows
+    # Google rejected; retryable errors are raised. A 400 means some row is invalid, so
+    # the entries are halved until each rejected row is on its own.
+    def _append(self, worksheet, entries):
+        entries = [entry for entry in entries if not entry.written]
+        if not entries:
+            return []
+        if self.log is not None:
+            self.log.mark_attempted(self._ids(entries))
+        for entry in entries:
+            entry.attempts += 1
+        try:
+            api_call("append_rows", worksheet.append_rows, [self._sheet_row(entry) for entry in entries],
+                     value_input_option="RAW")
+        except APIError as e:
+            if api_status(e) != 400:
+                raise
+            if len(entries) == 1:
+                return [(entries[0], e)]
+            middle = len(entries) // 2
+            return self._append(worksheet, entries[:middle]) + self._append(worksheet, entries[middle:])
+        for entry in entries:
+            entry.written = True
+        return []
+
+    # Append one batch; returns False when some of it was not written
+    def _write(self, batch):
+        try:
+            worksheet = get_worksheet(self.json_keyfile, self.spreadsheet_url, self.sheet_name)
+            pending = self._not_yet_written(worksheet, batch)
+            for entry in batch:
+                if entry not in pending:
+                    # Reached the sheet on an earlier attempt despite the error
+                    entry.written = True
+            rejected = self._append(worksheet, pending)
+        except Exception as e:
+            if needs_reset(e):
+                client_manager.reset(self.json_keyfile)
+            if is_retryable(e):
+                with self._cond:
+                    self.last_error = e
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** self._attempt)
+                    self._retry_at = time.time() + delay * random.uniform(0.5, 1.0)
+                    self._attempt += 1
+                return False
+            # The sheet or access is gone: nothing that is not written yet can be
+            rejected = [(entry, e) for entry in batch if not entry.written]
+
+        written = [entry for entry in batch if entry.written]
+        if self.log is not None:
+            self.log.mark_written(self._ids(written))
+            for entry, error in rejected:
+                self.log.mark_failed(self._ids([entry]), error)
+        with self._cond:
+            self.written += len(written)
+            self.failed.extend(entry.row for entry, _ in rejected)
+            if rejected:
+                self.last_error = rejected[-1][1]
+            self._attempt = 0
+            self._retry_at = 0
+            self._drop(len(batch))
+        return not rejected
+
+    def _drop(self, count):
+        del self._rows[:count]
+        self._oldest_at = time.time() if self._rows else None
+
+    # Write everything queued now, ignoring the thresholds. Returns False when a batch
+    # could not be written.
+    def flush(self):
+        while self.pending():
+            if not self._flush_batch():
+                return False
+        return True
+
+
+_lock = threading.Lock()
+_queues = {}
+
+
+# One queue per worksheet, shared by every session in the process. The options only
+# apply when the queue is created.
+def get_queue(json_keyfile, spreadsheet_url, sheet_name, log=None, id_column=None):
+    key = (json_keyfile, spreadsheet_url, sheet_name)
+    with _lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = _queues[key] = WriteBehindQueue(*key, log=log, id_column=id_column)
+        return queue